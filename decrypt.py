@@ -45,7 +45,8 @@ def decrypt(ciphertext_b64: str, password: str) -> str:
         raise ValueError(f"Failed to decode base64: {str(e)}")
     
     key = derive_key(password, len(encrypted))
-    decrypted = bytes(a ^ b for a, b in zip(encrypted, key))
+    # XOR the whole buffer as one big integer instead of byte by byte
+    decrypted = (int.from_bytes(encrypted, "big") ^ int.from_bytes(key, "big")).to_bytes(len(encrypted), "big")
     
     try:
         return decrypted.decode('utf-8')
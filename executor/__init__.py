@@ -366,6 +366,8 @@ class TaskExecutor:
         
         # Add API cost statistics if controller supports it
         if hasattr(self.controller, "get_cost_stats"):
+            if hasattr(self.controller, "flush_cost"):
+                self.controller.flush_cost()
             result_dict["api_cost_stats"] = self.controller.get_cost_stats()
         
         return result_dict
@@ -8,15 +8,101 @@ This module provides a base Controller class and implementations for:
 
 import os
 import re
+import sys
 import json
+import logging
+import functools
+import weakref
+from types import SimpleNamespace
+from abc import ABC, abstractmethod
 from typing import Any, Dict, List
 from openai import OpenAI
 from .utils import get_logger, colorize
-from .tools import get_browser_tools, get_unified_tools, map_tool_call_to_action
+from .tools import (
+    PARAM_OPTION_TEXT,
+    ToolSet,
+    get_browser_tools,
+    get_code_tools,
+    get_file_tools,
+    get_shell_tools,
+    get_unified_tools,
+    map_tool_call_to_action,
+)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = get_logger("llm")
 
 
+# Fast JSON for tool-call arguments and responses: orjson when installed, falling back to the stdlib
+# for anything orjson rejects (NaN/Infinity, integers wider than 64 bits, non-str keys)
+if orjson is not None:
+    def _json_loads(data: str) -> Any:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return json.loads(data)
+
+    def _json_dumps(obj: Any) -> str:
+        try:
+            return orjson.dumps(obj).decode()
+        except orjson.JSONEncodeError:
+            return json.dumps(obj)
+else:
+    _json_loads = json.loads
+    _json_dumps = json.dumps
+
+# Complete `<tool_call>{...}</tool_call>` blocks emitted by text-based tool-calling models
+TOOL_CALL_RE = re.compile(r'<tool_call>\s*({.*?})\s*</tool_call>', re.DOTALL)
+# Fallbacks for responses missing the opening tag: a JSON object right before `</tool_call>`,
+# then any flat object carrying both "name" and "arguments"
+_TOOL_CALL_FALLBACK_RE = re.compile(r'({[^{}]*"name"[^{}]*})\s*</tool_call>', re.DOTALL)
+_TOOL_CALL_FLEX_RE = re.compile(r'({[^{}]*"name"[^{}]*"arguments"[^{}]*})', re.DOTALL)
+# JSON inside a markdown code block
+_MD_JSON_RE = re.compile(r"```(?:json)?\s*\n?(.*?)\n?```", re.DOTALL)
+
+# Everything up to the last </think> (if a <think> tag is present), else up to an unclosed <think>
+_THINK_PREFIX_RE = re.compile(r"(?=.*?<think>).*</think>|.*?<think>", re.IGNORECASE | re.DOTALL)
+
+# JSON escapes for raw control characters (0x00-0x1F) found inside string values
+_CTRL_CHAR_TRANS = str.maketrans(
+    {chr(c): f"\\u{c:04x}" for c in range(32)}
+    | {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+)
+# An escape pair outside a string, or a (possibly unterminated) double-quoted string
+_JSON_STRING_RE = re.compile(r'\\.|"(?:\\.|[^"\\])*(?:"|\\?\Z)', re.DOTALL)
+_ESCAPE_PAIR_SPLIT_RE = re.compile(r'(\\.)', re.DOTALL)
+
+# A backslash that does not start a valid JSON escape sequence
+_BAD_ESCAPE_RE = re.compile(r"\\(?![\"\\/bfnrtu])")
+
+
+def _escape_json_string(match: re.Match) -> str:
+    """Escape control characters in a matched JSON string, leaving escape pairs intact."""
+    literal = match.group(0)
+    if literal[0] != '"':
+        return literal
+    if "\\" not in literal:
+        return literal.translate(_CTRL_CHAR_TRANS)
+    parts = _ESCAPE_PAIR_SPLIT_RE.split(literal)
+    parts[::2] = [part.translate(_CTRL_CHAR_TRANS) for part in parts[::2]]
+    return "".join(parts)
+
+
+def _fix_invalid_escapes(json_str: str) -> str:
+    """Double backslashes that do not start a valid JSON escape.
+    
+    Returns `json_str` itself when there is nothing to fix.
+    """
+    if "\\" not in json_str:
+        return json_str
+    fixed_json_str, count = _BAD_ESCAPE_RE.subn(r"\\\\", json_str)
+    return fixed_json_str if count else json_str
+
+
 def format_tools_as_text(tools: List[Dict[str, Any]]) -> str:
     """Convert OpenAI tool schema to text description for Qwen3-VL models.
     
@@ -34,45 +120,81 @@ def format_tools_as_text(tools: List[Dict[str, Any]]) -> str:
         description = func.get("description", "")
         parameters = func.get("parameters", {})
         properties = parameters.get("properties", {})
-        required = parameters.get("required", [])
+        
+        # Fast path: parameterless tools render as a single line
+        tool_text = f"- {name}: {description}"
+        if not properties:
+            tool_descriptions.append(tool_text)
+            continue
+        
+        required = set(parameters.get("required", ()))
         
         # Build parameter descriptions
         param_descriptions = []
         for param_name, param_info in properties.items():
             param_type = param_info.get("type", "string")
             param_desc = param_info.get("description", "")
-            param_enum = param_info.get("enum")
-            param_default = param_info.get("default")
+            option_text = PARAM_OPTION_TEXT.get((name, param_name))
+            if option_text is not None:
+                enum_text, default_text = option_text
+            else:
+                # Tool not in the static schemas; stringify on the fly
+                param_enum = param_info.get("enum")
+                param_default = param_info.get("default")
+                enum_text = ", ".join(map(str, param_enum)) if param_enum else None
+                default_text = str(param_default) if param_default is not None else None
             
             param_str = f"  - {param_name} ({param_type})"
             if param_desc:
                 param_str += f": {param_desc}"
-            if param_enum:
-                param_str += f" [options: {', '.join(map(str, param_enum))}]"
-            if param_default is not None:
-                param_str += f" [default: {param_default}]"
+            if enum_text:
+                param_str += f" [options: {enum_text}]"
+            if default_text is not None:
+                param_str += f" [default: {default_text}]"
             if param_name in required:
                 param_str += " [required]"
             
             param_descriptions.append(param_str)
         
         # Format tool description
-        tool_text = f"- {name}: {description}"
-        if param_descriptions:
-            tool_text += "\n" + "\n".join(param_descriptions)
+        tool_text += "\n" + "\n".join(param_descriptions)
         
         tool_descriptions.append(tool_text)
     
     return "\n\n".join(tool_descriptions)
 
 
-# Unified agent prompts
-UNIFIED_INITIAL_PROMPT_TEMPLATE = """
+# Rendered tool text per ToolSet, dropped automatically when the ToolSet is collected
+_TOOLS_TEXT_CACHE: "weakref.WeakKeyDictionary[ToolSet, str]" = weakref.WeakKeyDictionary()
+
+
+def get_tools_text(tools: List[Dict[str, Any]]) -> str:
+    """Return `format_tools_as_text(tools)`, reusing the cached text for a ToolSet.
+    
+    Args:
+        tools: List of tool definitions in OpenAI format
+        
+    Returns:
+        Formatted text description of all tools
+    """
+    if not isinstance(tools, ToolSet):
+        return format_tools_as_text(tools)
+    text = _TOOLS_TEXT_CACHE.get(tools)
+    if text is None:
+        text = _TOOLS_TEXT_CACHE[tools] = format_tools_as_text(tools)
+    return text
+
+
+# Unified agent prompts, composed from shared sections so the default and
+# Qwen3-VL variants do not each carry a copy of the tool guidelines
+_PROMPT_HEADER = """
 You are a powerful AI agent with access to a comprehensive sandbox environment. You can control a web browser, execute shell commands, manipulate files, and run Python code to solve complex, multi-domain tasks.
 
 Task:
 {instruction}
+"""
 
+_PROMPT_TOOLS_AND_GUIDELINES = """
 ## Available Tools
 
 ### Browser Tools
@@ -333,7 +455,9 @@ Task:
   - Suggest next steps or request human input
   - Include in `task_complete(result="failure_summary")` if task fails
 
-## Critical Reminders
+"""
+
+_PROMPT_CRITICAL_REMINDERS = """## Critical Reminders
 
 1. **ALWAYS use DOM operations first**: Start with `dom_mark_elements()`, then use `dom_click(bid)`, `dom_type(bid, text)`, etc.
 2. **Only use on-screen actions** when DOM operations fail or are unavailable
@@ -346,6 +470,22 @@ Task:
 9. **Stop retrying** after 6 failed browser actions - switch strategy or request help
 """
 
+_PROMPT_TOOL_CALL_FORMAT = """## Tool Call Format
+
+To call a tool, use this format:
+<tool_call>
+{{"name": "tool_name", "arguments": {{"param1": "value1", "param2": "value2"}}}}
+</tool_call>
+
+"""
+
+_PROMPT_SUMMARY_QWEN3VL = """
+## Summary
+Act visually, verify rigorously, and avoid blind exploration. Prefer one extra screenshot + VLM judgement before any ambiguous click.
+"""
+
+UNIFIED_INITIAL_PROMPT_TEMPLATE = _PROMPT_HEADER + _PROMPT_TOOLS_AND_GUIDELINES + _PROMPT_CRITICAL_REMINDERS
+
 UNIFIED_FEEDBACK_PROMPT_TEMPLATE = """
 Your previous actions have been executed. Here is the feedback:
 
@@ -366,296 +506,14 @@ Remember:
 """
 
 
-UNIFIED_INITIAL_PROMPT_TEMPLATE_QWEN3VL = """
-You are a powerful AI agent with access to a comprehensive sandbox environment. You can control a web browser, execute shell commands, manipulate files, and run Python code to solve complex, multi-domain tasks.
-
-Task:
-{instruction}
-
-{tools_description}
-
-## Available Tools
-
-### Browser Tools
-
-#### On-Screen Actions (Coordinate-based, require visual verification)
-**Mouse Actions:**
-- `browser_click(x, y, button?, num_clicks?)`: Click at coordinates (x, y) or current cursor position
-  - `button`: "left" (default), "right", or "middle"
-  - `num_clicks`: 1 (default), 2 (double-click), or 3
-  - Use `button="right"` for right-click, `num_clicks=2` for double-click
-- `browser_move_to(x, y)`: Move mouse cursor to absolute coordinates
-- `browser_move_rel(dx, dy)`: Move mouse cursor relative to current position
-- `browser_drag_to(x, y)`: Drag from current position to target coordinates
-- `browser_drag_rel(dx, dy)`: Drag relative to current position (useful for scrolling: move to scrollbar, then drag)
-
-**Keyboard Actions:**
-- `browser_type(text, use_clipboard?)`: Type text into currently focused element
-- `browser_press(key)`: Press a key (Enter, Tab, Escape, ArrowDown, PageDown, etc.)
-- `browser_key_down(key)`: Press and hold a key
-- `browser_key_up(key)`: Release a key
-- `browser_hotkey(keys)`: Press key combination (e.g., ["ctrl", "c"])
-
-**Misc:**
-- `browser_wait(duration)`: Wait for specified duration in seconds
-- `browser_screenshot()`: Capture current viewport (image) - CRITICAL for visual observation
-- `browser_get_viewport_info()`: Get current URL and viewport dimensions (useful for verifying page state after on-screen actions)
-
-**Navigation:**
-- `browser_navigate(url)`: Navigate to a URL (DOM load)
-
-
-#### DOM Actions (Selector-based, no vision required)
-
-**Observation Actions:**
-- `dom_get_text()`: Get page text (innerText of body, truncated if long)
-- `dom_get_html()`: Get page HTML (truncated if long)
-- `dom_query_selector(selector, limit?)`: List elements with detailed attributes (tag, id, class, name, type, href, aria-label, role, text). Use to identify precise selectors before clicking.
-- `dom_extract_links(filter_pattern?, limit?)`: Extract links (text + href) optionally filtered by substring
-- `dom_mark_elements(max_elements?)`: **[REQUIRED FIRST STEP]** Mark all interactive elements with unique BIDs and return structured list. Use this FIRST to get a comprehensive view of clickable/interactive elements with their attributes. Then use the BIDs with interaction actions below.
-
-**DOM Interaction Actions (Use BIDs from dom_mark_elements):**
-- `dom_click(bid, button?, click_count?, timeout_ms?)`: Click an element by its BID (obtained from dom_mark_elements)
-- `dom_hover(bid, timeout_ms?)`: Hover over an element by its BID
-- `dom_type(bid, text, clear_first?, timeout_ms?)`: Type text into an element by its BID
-- `dom_press(key, bid?, timeout_ms?)`: Press a key on an element by its BID (or on the page if bid not provided)
-- `dom_scroll(bid?, direction?, amount?, timeout_ms?)`: Scroll an element by its BID (or scroll the page if bid not provided). Returns scroll position info including whether at top/bottom/left/right.
-
-**Note**: Always use `dom_mark_elements` first to get BIDs, then use DOM interaction actions. These are more reliable than on-screen actions and don't require visual verification.
-
-### File Tools
-- `file_read(path)`: Read file content
-- `file_write(path, content)`: Write content to file
-- `file_list(path)`: List files in directory
-- `replace_in_file(file, old_text, new_text)`: Replace text in file
-- `search_in_file(file, pattern)`: Search for pattern in file
-- `find_files(path, glob)`: Find files matching glob pattern
-- `image_read(path)`: Read image files (PNG, JPG, etc.) and return as base64-encoded images for visual analysis
-- `str_replace_editor(command, path, ...)`: Powerful file editing with view/create/replace/insert/undo
-
-**Note**: All file paths are relative to `/home/gem/` (the sandbox root directory).
-
-### Code Execution Tools
-- `code_execute(code, language?, timeout?)`: Run code via sandbox runtime (python default); returns stdout/stderr
-- **Note**: Working directory is `/home/gem/`
-
-### Shell Tools
-- `shell_execute(command)`: Execute bash commands in the sandbox
-- **Note**: Working directory is `/home/gem/`
-
-### Task Management
-- `task_complete(result?)`: Mark task as complete. **MUST** call this when finished.
-  - If task requires returning a specific output, pass it as `result` parameter: `task_complete(result="your_answer")`
-  - If task generates files or has no specific output, call `task_complete()` without parameters
-
-## Tool-Specific Guidelines
-
-### Browser Tools Guidelines
-
-#### (a) Interaction Mode Selection
-- **CRITICAL: ALWAYS prefer DOM operations over on-screen actions**
-  - **First step**: Use `dom_mark_elements()` to get a list of all interactive elements with their BIDs
-  - **Then use**: `dom_click(bid)`, `dom_type(bid, text)`, `dom_hover(bid)`, `dom_press(bid, key)`, `dom_scroll(bid, direction)` with the BIDs from `dom_mark_elements`
-  - DOM operations are more reliable, faster, and don't require visual verification
-  - **CRITICAL: BIDs are DYNAMIC and TEMPORARY**
-    - BIDs are reassigned every time you run `dom_mark_elements()`
-    - **NEVER reuse old BIDs** from previous `dom_mark_elements()` calls
-    - If a click fails with "No element found with BID", the BID is stale - you MUST run `dom_mark_elements()` again to get fresh BIDs
-    - After any page change (navigation, modal open/close, element state change), run `dom_mark_elements()` again
-    - **DO NOT repeatedly click the same stale BID** - if it fails once, refresh BIDs immediately
-  - **Only use on-screen actions** when:
-    - DOM operations fail after multiple attempts
-    - Target elements are not accessible via DOM (e.g., canvas, video controls, custom widgets)
-    - You need to interact with non-DOM elements (tabs, browser back/forward buttons)
-
-#### (a2) Handling Modals, Popups, and Close Buttons
-- **When encountering popups/modals/dialogs:**
-  1. **Always run `dom_mark_elements` immediately** to identify interactive elements in the modal
-  2. **Look for close/dismiss buttons** - marked elements will include:
-     - Elements with `aria-label` containing "close", "dismiss", "cancel"
-     - Elements with `class` containing "close", "dismiss", "cancel"
-     - Elements with text like "×", "✕", "X", "Close", "No thanks", "Dismiss"
-     - Elements with `data-dismiss` or `data-close` attributes
-     - SVG icons or small divs/spans with cursor:pointer
-  3. **If modal blocks your target action:**
-     - First close the modal using identified close button BID
-     - Then run `dom_mark_elements` again to refresh BIDs for the underlying page
-     - Continue with your original task
-  4. **If close button is not in marked elements:**
-     - The element marking may have missed it due to DOM structure
-     - Try `browser_press("Escape")` to dismiss modal
-     - If Escape fails, use `browser_screenshot` to locate close button visually
-     - As last resort, use on-screen click on the close button coordinates
-  5. **Common error patterns:**
-     - **Clicking wrong element**: If you try to click something but keep clicking Overview/Specifications/Add to Cart instead of close button, it means the close button BID is missing. Run `dom_mark_elements` again and look for BIDs with class/aria-label/text indicating close/dismiss.
-     - **Element removed after click**: If click feedback says "Element removed from DOM", this is GOOD - it means you successfully clicked a close/dismiss button that removed the modal.
-
-#### (b) On-Screen Action Verification Protocol
-**CRITICAL: Every on-screen action MUST be verified with screenshots**
-
-1. **Before any on-screen action:**
-   - Take `browser_screenshot()` to:
-     - Locate target coordinates
-     - Verify mouse cursor position (if using relative movements)
-     - Confirm page state
-
-2. **After any on-screen action:**
-   - Take `browser_screenshot()` to verify:
-     - Action executed correctly (e.g., clicked element changed state)
-     - Page content changed as expected
-     - No error dialogs appeared
-   - Call `browser_get_viewport_info()` to verify:
-     - URL changed (if navigation occurred)
-     - Viewport dimensions (if relevant)
-
-3. **Specific action requirements:**
-   - **Before `browser_type` or `browser_press`**: 
-     - MUST verify cursor/focus is on correct element via screenshot
-     - Ensure target input field is visible and focused
-   - **Before `browser_drag_to/rel` or scrolling**:
-     - MUST verify scrollbar position via screenshot
-     - Confirm drag start position is correct
-   - **For `browser_click`**:
-     - Verify target coordinates are correct via screenshot
-     - Do NOT click same coordinates > 2 times unless state change occurred
-   - **For all mouse movements**:
-     - Verify final position via screenshot if critical
-
-4. **State change verification:**
-   - Compare screenshots before/after action
-   - Treat action as successful ONLY if:
-     - URL changed meaningfully, OR
-     - Page content (screenshot) changed meaningfully
-   - If no meaningful change, treat as failed and try different approach
-
-#### (c) Failure Modes and Recovery
-
-**DOM Operation Failures:**
-- **Common causes:**
-  - **Stale BID**: BID from previous `dom_mark_elements()` call is no longer valid (element was re-rendered, page changed, etc.)
-  - Element removed from DOM after previous action
-  - Element not yet loaded or visible
-- **Recovery strategies:**
-  - **If click/hover/type fails with "No element found with BID"**: 
-    - **IMMEDIATELY run `dom_mark_elements()` again** to get fresh BIDs
-    - **DO NOT retry the same stale BID** - it will never work
-    - Find the target element in the new BID list and use the new BID
-  - **If same BID fails > 1 time**: Stop retrying that BID, refresh BIDs immediately
-  - **After page state changes** (modal opens/closes, navigation, element updates): Always run `dom_mark_elements()` again
-  - **If element keeps disappearing**: The element may be dynamically recreated - use `dom_query_selector` to find it by attributes instead
-
-**On-Screen Action Failures:**
-- **Common causes:**
-  - Mouse clicked wrong position (coordinates inaccurate)
-  - Time gap between actions too long → mouse cursor disappeared (need to click anywhere to restore)
-  - Target element moved/not loaded yet
-- **Recovery strategies:**
-  - If same coordinates fail > 2 times: Stop retrying, switch to DOM operations
-  - If mouse disappeared: Click any visible element first to restore cursor
-  - If wrong page loaded: Use `browser_navigate(url)` to return to previous page
-  - After 6 consecutive browser actions without verified progress:
-    - Stop automated attempts
-    - Switch to DOM operations (e.g., use `dom_mark_elements` then `dom_click` with BID)
-    - Or use `code_execute` to programmatically scrape/interact
-    - Document attempts and request human input if needed
-
-**Non-DOM Elements:**
-- Some elements (tabs, browser back/forward, custom widgets) cannot be accessed via DOM operations
-- These MUST use on-screen actions with careful coordinate verification
-
-**Error Pages (404, maintenance, blocked):**
-- If screenshot shows error page:
-  - Do NOT try to find elements on error page
-  - Use `browser_navigate(url)` to go to:
-    - Previous valid page
-    - Site root or known canonical entry
-    - Alternative resource
-
-**No Fabrication:**
-- Never invent URLs, filenames, or data
-- Never use placeholder domains (example.com) as actual inputs
-- If required resource cannot be found, document:
-  - What you searched
-  - Screenshots/evidence
-  - Why search failed
-
-### Code & Shell Tools Guidelines
-- **Working directory**: Always `/home/gem/`
-- Use relative paths from `/home/gem/` or absolute paths starting with `/home/gem/`
-- For file operations, remember root is `/home/gem/`
-
-## Cross-Tool Workflow Guidelines
-
-### Download Workflow
-1. **Find download target via browser:**
-   - Use `dom_query_selector` or `dom_extract_links` to find download links
-   - Or use `browser_screenshot` + visual analysis to locate download button
-   - Verify it's the correct file (e.g., PDF) via screenshot or DOM text
-
-2. **Download file:**
-   - **DO NOT** use on-screen clicks blindly
-   - **PREFER**: Use `shell_execute` with wget/curl or `code_execute` to download programmatically:
-     - Using shell: `shell_execute("wget -O /home/gem/file.pdf https://example.com/file.pdf")`
-     - Using code:
-       ```python
-       import requests
-       url = "https://example.com/file.pdf"
-       response = requests.get(url)
-       with open("/home/gem/file.pdf", "wb") as f:
-           f.write(response.content)
-       ```
-   - Or use `dom_mark_elements` then `dom_click` with BID if download link is available
-
-3. **Verify download:**
-   - Use `file_list("/home/gem")` or `shell_execute("ls -lh /home/gem/file.pdf")` to verify file exists
-   - Use `file_read` or `code_execute` to verify file content/parsability
-
-### File Verification
-- After saving any file, verify:
-  - File exists: `file_list(path)` or `shell_execute("test -f /home/gem/path && echo exists")`
-  - File size > 0: `shell_execute("stat -c%s /home/gem/path")`
-  - For PDFs/documents: Parse via `code_execute` to confirm expected sections exist
-
-### Using Code to Implement Missing Capabilities
-- If needed operation not supported by tools:
-  - Implement helper in `code_execute`
-  - Verify output before using
-  - Examples: advanced parsing, OCR, link discovery, data extraction
-
-### Logging Progress
-- Record milestones to `/home/gem/task_progress.txt`:
-  - Brief notes on what was accomplished
-  - Screenshot references used for decisions
-  - File paths created/modified
-
-### Failure Reporting
-- If subtask cannot be completed after reasonable attempts:
-  - Document: actions tried, screenshot references, why each failed
-  - Suggest next steps or request human input
-  - Include in `task_complete(result="failure_summary")` if task fails
-
-## Tool Call Format
-
-To call a tool, use this format:
-<tool_call>
-{{"name": "tool_name", "arguments": {{"param1": "value1", "param2": "value2"}}}}
-</tool_call>
-
-## Critical Reminders
-
-1. **ALWAYS use DOM operations first**: Start with `dom_mark_elements()`, then use `dom_click(bid)`, `dom_type(bid, text)`, etc.
-2. **Only use on-screen actions** when DOM operations fail or are unavailable
-3. **Always verify on-screen actions** with screenshots before and after (if you must use them)
-4. **Remember working directory** is `/home/gem/` for all file/code/shell operations
-5. **Download files programmatically** using `code_execute`, not blind clicks
-6. **Verify all file operations** (existence, size, content)
-7. **MUST call `task_complete`** when finished, with result if applicable
-8. **No fabrication** - never invent URLs, filenames, or data
-9. **Stop retrying** after 6 failed browser actions - switch strategy or request help
-
-## Summary
-Act visually, verify rigorously, and avoid blind exploration. Prefer one extra screenshot + VLM judgement before any ambiguous click.
-"""
+UNIFIED_INITIAL_PROMPT_TEMPLATE_QWEN3VL = (
+    _PROMPT_HEADER
+    + "\n{tools_description}\n"
+    + _PROMPT_TOOLS_AND_GUIDELINES
+    + _PROMPT_TOOL_CALL_FORMAT
+    + _PROMPT_CRITICAL_REMINDERS
+    + _PROMPT_SUMMARY_QWEN3VL
+)
 
 UNIFIED_FEEDBACK_PROMPT_TEMPLATE_QWEN3VL = """
 Your previous actions have been executed. Here is the feedback:
@@ -680,9 +538,30 @@ Remember:
 """
 
 
-class Controller:
+def _split_template(template: str, field: str) -> tuple[str, str]:
+    """Split a single-field format template into its literal prefix and suffix.
+
+    The feedback templates are rendered once per iteration; pre-splitting them
+    at import turns each render into a plain concatenation instead of re-parsing
+    the whole template with `str.format`.
+    """
+    sentinel = "\x00"
+    prefix, suffix = template.format(**{field: sentinel}).split(sentinel)
+    return prefix, suffix
+
+
+_UNIFIED_FEEDBACK_PARTS = _split_template(UNIFIED_FEEDBACK_PROMPT_TEMPLATE, "feedback")
+_UNIFIED_FEEDBACK_PARTS_QWEN3VL = _split_template(UNIFIED_FEEDBACK_PROMPT_TEMPLATE_QWEN3VL, "feedback")
+
+
+class Controller(ABC):
     """Base class for controllers that generate actions given a prompt."""
 
+    # Shared compiled pattern for text-based tool calls; subclasses use
+    # `self.TOOL_CALL_RE.finditer(response)` instead of recompiling
+    TOOL_CALL_RE = TOOL_CALL_RE
+
+    @abstractmethod
     def call(self, prompt: str, message_history: List[Dict[str, Any]] | None = None) -> Dict[str, Any]:
         """Send a prompt and return the parsed action/response.
 
@@ -697,10 +576,12 @@ class Controller:
         """
         raise NotImplementedError("Not implemented")
 
+    @abstractmethod
     def clear_history(self) -> None:
         """Clear any stored conversation history."""
         raise NotImplementedError("Not implemented")
 
+    @abstractmethod
     def build_prompt(self, task_description: str = None, feedback: str = None) -> str:
         """Build a prompt for the controller.
 
@@ -713,6 +594,7 @@ class Controller:
         """
         raise NotImplementedError("Not implemented")
 
+    @abstractmethod
     def parse_response(self, response: str) -> Dict[str, Any]:
         """Parse controller's response into a structured format.
 
@@ -798,8 +680,11 @@ OPENAI_PRICING = {
         "input": 2.00,
         "cached_input": 0.20,
         "output": None
-    },
-    # Legacy models (fallback pricing)
+    }
+}
+
+# Legacy models (fallback pricing), checked only when the current models miss
+OPENAI_PRICING_LEGACY = {
     "gpt-4o": {
         "input": 2.50,
         "cached_input": 0.25,
@@ -823,70 +708,162 @@ OPENAI_PRICING = {
 }
 
 
-def get_model_pricing(model_name: str) -> Dict[str, float | None]:
+# Flattened views of the pricing tables: model -> (input, cached_input, output) per 1M tokens.
+# Cost accounting runs after every API call, so it reads these tuples instead of
+# indexing into the nested per-model dicts.
+_PRICING_FLAT: Dict[str, tuple[float | None, float | None, float | None]] = {
+    model: (prices["input"], prices["cached_input"], prices["output"])
+    for model, prices in OPENAI_PRICING.items()
+}
+_PRICING_FLAT_LEGACY: Dict[str, tuple[float | None, float | None, float | None]] = {
+    model: (prices["input"], prices["cached_input"], prices["output"])
+    for model, prices in OPENAI_PRICING_LEGACY.items()
+}
+# Longest keys first so fuzzy matching prefers the most specific model (e.g. gpt-4.1-mini over gpt-4.1)
+_PRICING_KEYS_BY_LEN = sorted([*_PRICING_FLAT, *_PRICING_FLAT_LEGACY], key=len, reverse=True)
+
+
+@functools.lru_cache(maxsize=128)
+def get_model_pricing(model_name: str) -> tuple[float | None, float | None, float | None]:
     """Get pricing for a model, with fallback to closest match.
     
     Args:
         model_name: Model name (e.g., "gpt-5.2", "gpt-4.1")
         
     Returns:
-        Dictionary with input, cached_input, and output pricing per 1M tokens
+        Tuple of (input, cached_input, output) pricing per 1M tokens; None means no price.
+        Results are cached per model name, so the fallback warning is logged once.
     """
     model_lower = model_name.lower()
     
-    # Direct match
-    if model_lower in OPENAI_PRICING:
-        return OPENAI_PRICING[model_lower]
+    # Direct match (current models first, then legacy)
+    pricing = _PRICING_FLAT.get(model_lower) or _PRICING_FLAT_LEGACY.get(model_lower)
+    if pricing is not None:
+        return pricing
     
     # Try to match by prefix
-    for key, pricing in OPENAI_PRICING.items():
+    for key in _PRICING_KEYS_BY_LEN:
         if model_lower.startswith(key) or key in model_lower:
-            return pricing
+            return _PRICING_FLAT.get(key) or _PRICING_FLAT_LEGACY[key]
     
     # Default fallback to gpt-4.1 pricing
     logger.warning(f"Unknown model pricing for {model_name}, using gpt-4.1 pricing as fallback")
-    return OPENAI_PRICING.get("gpt-4.1", {"input": 3.00, "cached_input": 0.75, "output": 12.00})
+    return _PRICING_FLAT.get("gpt-4.1", (3.00, 0.75, 12.00))
 
 
-def calculate_cost(usage, model_name: str) -> float:
-    """Calculate API cost from usage information.
+# Shared OpenAI clients keyed by (api_key, base_url)
+_CLIENT_CACHE: Dict[tuple[str, str], OpenAI] = {}
+
+
+def _get_openai_client(api_key: str | None = None, base_url: str | None = None) -> OpenAI:
+    """Return a shared OpenAI client so connection pools and TLS sessions are reused.
+
+    Controllers should obtain their client here rather than constructing their own.
+    """
+    key = (api_key or "", base_url or "")
+    client = _CLIENT_CACHE.get(key)
+    if client is None:
+        client_kwargs = {}
+        if api_key:
+            client_kwargs["api_key"] = api_key
+        if base_url:
+            client_kwargs["base_url"] = base_url
+        client = _CLIENT_CACHE.setdefault(key, OpenAI(**client_kwargs))
+    return client
+
+
+def calculate_cost_from_counts(prompt_tokens: int, completion_tokens: int, cached_tokens: int, model_name: str) -> float:
+    """Calculate API cost from token counts.
     
     Args:
-        usage: Usage object from OpenAI API response (has prompt_tokens, completion_tokens, total_tokens, cached_tokens)
+        prompt_tokens: Number of input tokens (including cached tokens)
+        completion_tokens: Number of output tokens
+        cached_tokens: Number of cached input tokens
         model_name: Model name for pricing lookup
         
     Returns:
         Total cost in USD
     """
-    pricing = get_model_pricing(model_name)
-    
-    # Get token counts (default to 0 if not present)
-    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
-    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
-    cached_tokens = getattr(usage, "cached_tokens", 0) or 0
+    input_price, cached_price, output_price = get_model_pricing(model_name)
     
     # Calculate costs
     input_cost = 0.0
-    if cached_tokens > 0 and pricing.get("cached_input") is not None:
+    if cached_tokens > 0 and cached_price is not None:
         # Use cached pricing for cached tokens
-        input_cost += (cached_tokens / 1_000_000) * pricing["cached_input"]
+        input_cost += (cached_tokens / 1_000_000) * cached_price
         # Use regular input pricing for non-cached tokens
         non_cached = prompt_tokens - cached_tokens
-        if non_cached > 0 and pricing.get("input") is not None:
-            input_cost += (non_cached / 1_000_000) * pricing["input"]
+        if non_cached > 0 and input_price is not None:
+            input_cost += (non_cached / 1_000_000) * input_price
     else:
         # All tokens use regular input pricing
-        if pricing.get("input") is not None:
-            input_cost = (prompt_tokens / 1_000_000) * pricing["input"]
+        if input_price is not None:
+            input_cost = (prompt_tokens / 1_000_000) * input_price
     
     output_cost = 0.0
-    if completion_tokens > 0 and pricing.get("output") is not None:
-        output_cost = (completion_tokens / 1_000_000) * pricing["output"]
+    if completion_tokens > 0 and output_price is not None:
+        output_cost = (completion_tokens / 1_000_000) * output_price
     
     total_cost = input_cost + output_cost
     return total_cost
 
 
+def get_cached_tokens(usage) -> int:
+    """Get the number of cached prompt tokens from a usage object.
+    
+    OpenAI reports these under `prompt_tokens_details.cached_tokens`; some
+    OpenAI-compatible servers put `cached_tokens` on the usage object itself.
+    """
+    cached_tokens = getattr(usage, "cached_tokens", None)
+    if cached_tokens is None:
+        cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+    return cached_tokens or 0
+
+
+def calculate_cost(usage, model_name: str) -> float:
+    """Calculate API cost from usage information.
+    
+    Args:
+        usage: Usage object from OpenAI API response (has prompt_tokens, completion_tokens, total_tokens, cached_tokens)
+        model_name: Model name for pricing lookup
+        
+    Returns:
+        Total cost in USD
+    """
+    # Get token counts (default to 0 if not present)
+    return calculate_cost_from_counts(
+        getattr(usage, "prompt_tokens", 0) or 0,
+        getattr(usage, "completion_tokens", 0) or 0,
+        get_cached_tokens(usage),
+        model_name,
+    )
+
+
+@functools.lru_cache(maxsize=64)
+def _classify_model(model_name: str) -> tuple[bool, bool]:
+    """Detect the model family from its name.
+    
+    Returns:
+        Tuple of (is_qwen_model, is_qwen_vl_model)
+    """
+    model_lower = model_name.lower() if isinstance(model_name, str) else ""
+    return "qwen" in model_lower, "qwen3-vl" in model_lower or "qwen3_vl" in model_lower
+
+
+# Prompts shorter than this are never cached by the provider
+_PROMPT_CACHE_MIN_TOKENS = 1024
+
+# Tool definitions for each client type
+_TOOL_FACTORIES = {
+    "unified": get_unified_tools,
+    "browser": get_browser_tools,
+    "file": get_file_tools,
+    "code": get_code_tools,
+    "jupyter": get_code_tools,
+    "shell": get_shell_tools,
+}
+
+
 class LLM(Controller):
     """Language model client using OpenAI API."""
 
@@ -920,15 +897,14 @@ class LLM(Controller):
                 api_key = "EMPTY"
                 logger.info("No OPENAI_API_KEY or base_url provided. Falling back to local vLLM at http://localhost:8001/v1")
 
-        # Initialize OpenAI client
-        client_kwargs = {}
-        if api_key:
-            client_kwargs["api_key"] = api_key
-        if base_url:
-            client_kwargs["base_url"] = base_url
-
-        self.client = OpenAI(**client_kwargs)
+        # Initialize (or reuse) the OpenAI client
+        self.client = _get_openai_client(api_key, base_url)
         self.messages: List[Dict[str, str]] = []
+        # Leading messages (the task prompt) that are never trimmed, keeping the
+        # request prefix stable for provider-side prompt caching
+        self._prefix_len: int = 0
+        # Max messages kept after the prefix; 0 keeps the full conversation
+        self.max_context_messages = max(0, int(llm_config.get("max_context_messages", 0)))
         self.last_think: str | None = None  # Store the last think/reasoning content for visualization
         
         # Cost tracking
@@ -937,36 +913,45 @@ class LLM(Controller):
         self.total_output_tokens: int = 0
         self.total_cached_tokens: int = 0
         self.api_calls: int = 0
+        # Log per-call cost at INFO every N calls (DEBUG otherwise); flush_cost() logs the rest
+        self._cost_log_interval = max(1, int(llm_config.get("cost_log_interval", 1)))
+        self._cost_logged_calls: int = 0
+        # Pre-keyed cost stats updated in place by get_cost_stats()
+        self._cost_stats: Dict[str, Any] = {
+            "total_cost_usd": 0.0,
+            "total_input_tokens": 0,
+            "total_output_tokens": 0,
+            "total_cached_tokens": 0,
+            "total_tokens": 0,
+            "api_calls": 0,
+            "model": self.model
+        }
+        self._cost_stats_total: float = 0.0
+        # Log calls whose cached-token share of the prompt falls below this ratio
+        self._cache_hit_warn_threshold = float(llm_config.get("cache_hit_warn_threshold", 0.3))
         
         # Store client type and determine tool usage
         self.client_type = client_type
         self.use_tools = client_type in ["browser", "file", "code", "jupyter", "shell", "unified"]
         self.max_parse_retries = max(1, int(llm_config.get("max_parse_retries", 2)))
         
-        # Load appropriate tools based on client type
-        if self.use_tools:
-            from .tools import get_browser_tools, get_file_tools, get_code_tools, get_shell_tools, get_unified_tools
-            if client_type == "unified":
-                self.tools = get_unified_tools()
-            elif client_type == "browser":
-                self.tools = get_browser_tools()
-            elif client_type == "file":
-                self.tools = get_file_tools()
-            elif client_type == "code" or client_type == "jupyter":
-                self.tools = get_code_tools()
-            elif client_type == "shell":
-                self.tools = get_shell_tools()
-            else:
-                self.tools = None
-        else:
-            self.tools = None
-        
-        # Detect if using Qwen model (for special parsing)
-        self.is_qwen_model = "qwen" in self.model.lower() if isinstance(self.model, str) else False
+        # Load appropriate tools based on client type (tool lists are shared across instances)
+        tool_factory = _TOOL_FACTORIES.get(client_type) if self.use_tools else None
+        self.tools = tool_factory() if tool_factory is not None else None
         
-        # Detect if using Qwen3-VL model (for vision support)
-        model_lower = self.model.lower() if isinstance(self.model, str) else ""
-        self.is_qwen_vl_model = "qwen3-vl" in model_lower or "qwen3_vl" in model_lower
+        # Detect if using Qwen model (for special parsing) or Qwen3-VL model (for vision support)
+        self.is_qwen_model, self.is_qwen_vl_model = _classify_model(self.model)
+
+        # Static API call parameters; messages are passed per call
+        # (tools are omitted for Qwen3-VL, which uses text-based tool calls)
+        self._base_api_params: Dict[str, Any] = {"model": self.model}
+        if self.use_tools and self.tools and not self.is_qwen_vl_model:
+            self._base_api_params["tools"] = self.tools
+        # Optionally stream completions so the response is consumed as it arrives
+        self.stream = bool(llm_config.get("stream", False))
+        if self.stream:
+            self._base_api_params["stream"] = True
+            self._base_api_params["stream_options"] = {"include_usage": True}
 
         logger.info(f"LLM initialized with model: {self.model}")
         if base_url:
@@ -989,99 +974,100 @@ class LLM(Controller):
             Parsed response dictionary with action information
         """
         # Handle backward compatibility: if single string is passed, convert to list
-        if images_base64 is not None and isinstance(images_base64, str):
+        if images_base64.__class__ is str:
             images_base64 = [images_base64]
         
         # Build message content based on whether we have images
-        if images_base64 and len(images_base64) > 0:
-            # Build content list with text and all images
-            message_content = []
+        if images_base64:
+            # Build the data URLs once; the message is appended once and reused across retries
+            image_parts = [
+                {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{img_base64}"}}
+                for img_base64 in images_base64
+            ]
+            text_part = {"type": "text", "text": prompt}
             
             # Add text first (for OpenAI format) or after images (for Qwen3-VL)
             if self.is_qwen_vl_model:
                 # Qwen3-VL format: images first, then text
-                for img_base64 in images_base64:
-                    message_content.append({
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/png;base64,{img_base64}"
-                        }
-                    })
-                message_content.append({
-                    "type": "text",
-                    "text": prompt
-                })
+                message_content = image_parts + [text_part]
             else:
                 # OpenAI multimodal format: text first, then images
-                message_content.append({
-                    "type": "text",
-                    "text": prompt
-                })
-                for img_base64 in images_base64:
-                    message_content.append({
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/png;base64,{img_base64}"
-                        }
-                    })
-            logger.debug(f"Adding {len(images_base64)} image(s) to message (total size: {sum(len(img) for img in images_base64)} chars)")
+                message_content = [text_part] + image_parts
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Adding %d image(s) to message (total size: %d chars)", len(images_base64), sum(len(img) for img in images_base64))
         else:
             # Regular text message
             message_content = prompt
 
         self.messages.append({"role": "user", "content": message_content})
+        if not self._prefix_len:
+            self._prefix_len = len(self.messages)
 
         attempt = 0
         max_attempts = self.max_parse_retries
 
         while attempt < max_attempts:
             attempt += 1
-            logger.debug(f"Sending prompt to {self.model} (conversation depth: {len(self.messages)}, attempt {attempt}/{max_attempts})")
+            logger.debug("Sending prompt to %s (conversation depth: %d, attempt %d/%d)", self.model, len(self.messages), attempt, max_attempts)
 
             try:
-                # Prepare API call parameters
-                api_params = {
-                    "model": self.model,
-                    "messages": self.messages
-                }
-                
-                # Add tools if in tool calling mode (except for Qwen3-VL text-based tool calls)
-                if self.use_tools and self.tools and not self.is_qwen_vl_model:
-                    api_params["tools"] = self.tools
-                
-                response = self.client.chat.completions.create(**api_params)
+                self._trim_context()
+                response = self.client.chat.completions.create(messages=self.messages, **self._base_api_params)
+                if self.stream:
+                    response = self._collect_stream(response)
 
                 # Calculate and track API cost
                 if hasattr(response, "usage") and response.usage:
                     usage = response.usage
-                    cost = calculate_cost(usage, self.model)
+                    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+                    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+                    cached_tokens = get_cached_tokens(usage)
+                    cost = calculate_cost_from_counts(prompt_tokens, completion_tokens, cached_tokens, self.model)
                     self.total_cost += cost
-                    self.total_input_tokens += getattr(usage, "prompt_tokens", 0) or 0
-                    self.total_output_tokens += getattr(usage, "completion_tokens", 0) or 0
-                    self.total_cached_tokens += getattr(usage, "cached_tokens", 0) or 0
+                    self.total_input_tokens += prompt_tokens
+                    self.total_output_tokens += completion_tokens
+                    self.total_cached_tokens += cached_tokens
                     self.api_calls += 1
                     
-                    logger.info(
-                        f"API call cost: ${cost:.6f} | "
-                        f"Tokens: {getattr(usage, 'prompt_tokens', 0)} input, "
-                        f"{getattr(usage, 'completion_tokens', 0)} output, "
-                        f"{getattr(usage, 'cached_tokens', 0)} cached | "
-                        f"Total cost: ${self.total_cost:.6f}"
+                    # Per-call cost goes to INFO every `cost_log_interval` calls, DEBUG otherwise
+                    if self.api_calls % self._cost_log_interval == 0:
+                        level = logging.INFO
+                        self._cost_logged_calls = self.api_calls
+                    else:
+                        level = logging.DEBUG
+                    logger.log(
+                        level,
+                        "API call cost: $%.6f | Tokens: %d input, %d output, %d cached (%.1f%% hit) | Total cost: $%.6f",
+                        cost, prompt_tokens, completion_tokens, cached_tokens,
+                        100 * cached_tokens / prompt_tokens if prompt_tokens else 0.0, self.total_cost,
                     )
+                    # Past the first turn the conversation prefix should be served from the
+                    # provider's prompt cache; surface calls where that stops happening
+                    if (
+                        len(self.messages) > self._prefix_len
+                        and prompt_tokens >= _PROMPT_CACHE_MIN_TOKENS
+                        and cached_tokens / prompt_tokens < self._cache_hit_warn_threshold
+                    ):
+                        logger.info(
+                            "Low prompt cache hit rate: %d/%d prompt tokens cached (%.1f%%)",
+                            cached_tokens, prompt_tokens, 100 * cached_tokens / prompt_tokens,
+                        )
 
                 message = response.choices[0].message
                 
                 # Handle Qwen model special format (text-based tool calls)
                 assistant_message = message.content if message.content else ""
                 # Check for tool calls either by content pattern or model type
-                has_tool_call_pattern = ("<tool_call>" in assistant_message or "</tool_call>" in assistant_message)
+                # "tool_call>" is shared by both <tool_call> and </tool_call>, so one scan finds either tag
+                has_tool_call_pattern = "tool_call>" in assistant_message
                 if self.use_tools and assistant_message and (has_tool_call_pattern or self.is_qwen_model):
                     tool_calls = self.parse_text_tool_calls(assistant_message)
                     if tool_calls:
                         # Save think content (extract reasoning before tool calls) for visualization
                         # For Qwen, the think content is usually before <tool_call> tags
-                        if "<tool_call>" in assistant_message:
-                            think_part = assistant_message.split("<tool_call>")[0].strip()
+                        think_part, tag, _ = assistant_message.partition("<tool_call>")
+                        if tag:
+                            think_part = think_part.strip()
                             self.last_think = think_part if think_part else None
                         else:
                             # For Qwen without tags, try to extract reasoning (content before tool calls)
@@ -1090,11 +1076,12 @@ class LLM(Controller):
                         self.messages.append({"role": "assistant", "content": assistant_message})
                         
                         model_name = "Qwen3-VL" if has_tool_call_pattern else "Qwen"
-                        logger.debug(f"Parsed {len(tool_calls)} tool calls from {model_name} model")
+                        logger.debug("Parsed %d tool calls from %s model", len(tool_calls), model_name)
                         
                         try:
                             parsed_response = self.parse_tool_calls_list(tool_calls)
-                            logger.debug(f"Parsed tool calls (ACTION): \n{colorize(json.dumps(parsed_response, indent=2), 'YELLOW')}")
+                            if logger.isEnabledFor(logging.DEBUG):
+                                logger.debug(f"Parsed tool calls (ACTION): \n{colorize(json.dumps(parsed_response, indent=2), 'YELLOW')}")
                             return parsed_response
                         except ValueError as parse_error:
                             logger.warning(f"Failed to parse {model_name} tool calls (attempt {attempt}/{max_attempts}): {parse_error}")
@@ -1120,26 +1107,29 @@ class LLM(Controller):
                     # Save think content (reasoning before action) for visualization
                     self.last_think = message.content if message.content else None
                     
+                    assistant_tool_calls = []
+                    for tc in message.tool_calls:
+                        fn = tc.function
+                        assistant_tool_calls.append({
+                            "id": tc.id,
+                            "type": tc.type,
+                            "function": {
+                                "name": fn.name,
+                                "arguments": fn.arguments
+                            }
+                        })
                     self.messages.append({
                         "role": "assistant",
                         "content": message.content,
-                        "tool_calls": [
-                            {
-                                "id": tc.id,
-                                "type": tc.type,
-                                "function": {
-                                    "name": tc.function.name,
-                                    "arguments": tc.function.arguments
-                                }
-                            } for tc in message.tool_calls
-                        ]
+                        "tool_calls": assistant_tool_calls
                     })
                     
-                    logger.debug(f"Received {len(message.tool_calls)} tool calls from {self.model}")
+                    logger.debug("Received %d tool calls from %s", len(message.tool_calls), self.model)
                     
                     try:
                         parsed_response = self.parse_tool_calls(message.tool_calls)
-                        logger.debug(f"Parsed tool calls (ACTION): \n{colorize(json.dumps(parsed_response, indent=2), 'YELLOW')}")
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug(f"Parsed tool calls (ACTION): \n{colorize(json.dumps(parsed_response, indent=2), 'YELLOW')}")
                         return parsed_response
                     except ValueError as parse_error:
                         logger.warning(f"Failed to parse tool calls (attempt {attempt}/{max_attempts}): {parse_error}")
@@ -1175,11 +1165,13 @@ class LLM(Controller):
                     self.last_think = assistant_message
                     self.messages.append({"role": "assistant", "content": assistant_message})
 
-                    logger.debug(f"Received response from {self.model} (length: {len(assistant_message)} chars)")
+                    logger.debug("Received response from %s (length: %d chars)", self.model, len(assistant_message))
 
                     try:
-                        parsed_response = self.parse_response(assistant_message)
-                        logger.debug(f"Parsed response (ACTION): \n{colorize(json.dumps(parsed_response, indent=2), 'YELLOW')}")
+                        # The tool-call scan above already ran (or found no tags) for this message
+                        parsed_response = self.parse_response(assistant_message, skip_tool_call_scan=True)
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug(f"Parsed response (ACTION): \n{colorize(json.dumps(parsed_response, indent=2), 'YELLOW')}")
                         return parsed_response
                     except ValueError as parse_error:
                         logger.warning(f"Failed to parse assistant response (attempt {attempt}/{max_attempts}): {parse_error}")
@@ -1209,6 +1201,60 @@ class LLM(Controller):
         # If loop exits without return, raise error
         raise ValueError("Failed to obtain a valid action after retrying LLM response parsing.")
 
+    def _collect_stream(self, stream) -> SimpleNamespace:
+        """Drain a streamed chat completion into a response-shaped object.
+        
+        Content and tool-call deltas are accumulated as chunks arrive; usage comes from
+        the final chunk. If the server does not report usage for streamed responses,
+        streaming is turned off for later calls so cost tracking keeps working.
+        
+        Args:
+            stream: Iterator of chat completion chunks
+            
+        Returns:
+            Object exposing `usage` and `choices[0].message` like a non-streamed response
+        """
+        content_parts = []
+        tool_call_parts: Dict[int, Dict[str, Any]] = {}
+        usage = None
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                content_parts.append(delta.content)
+            for tc in delta.tool_calls or ():
+                parts = tool_call_parts.setdefault(tc.index, {"id": None, "type": "function", "name": [], "arguments": []})
+                if tc.id:
+                    parts["id"] = tc.id
+                if tc.type:
+                    parts["type"] = tc.type
+                fn = tc.function
+                if fn is not None:
+                    if fn.name:
+                        parts["name"].append(fn.name)
+                    if fn.arguments:
+                        parts["arguments"].append(fn.arguments)
+        
+        if usage is None:
+            logger.warning("Streamed response did not include usage; disabling streaming for this LLM")
+            self.stream = False
+            self._base_api_params.pop("stream", None)
+            self._base_api_params.pop("stream_options", None)
+        
+        tool_calls = [
+            SimpleNamespace(
+                id=parts["id"],
+                type=parts["type"],
+                function=SimpleNamespace(name="".join(parts["name"]), arguments="".join(parts["arguments"]))
+            )
+            for _, parts in sorted(tool_call_parts.items())
+        ]
+        message = SimpleNamespace(content="".join(content_parts) or None, tool_calls=tool_calls or None)
+        return SimpleNamespace(usage=usage, choices=[SimpleNamespace(message=message)])
+
     def build_prompt(self, task_description: str = None, feedback: str = None, conversation_history: list = None) -> str:
         """Build the initial prompt for the LLM.
         
@@ -1218,16 +1264,14 @@ class LLM(Controller):
             conversation_history: List of previous conversation turns (commented out - using self.messages for context instead)
         """
         
-        # For Qwen3-VL models, include tool descriptions in prompt
-        tools_description = ""
-        if self.is_qwen_vl_model and self.use_tools and self.tools:
-            tools_description = format_tools_as_text(self.tools)
-        
         if task_description is not None:
             # Initial prompt - only used for first iteration
             if self.is_qwen_vl_model:
                 # Use Qwen3-VL specific templates with tool descriptions
                 if self.client_type == "unified":
+                    tools_description = ""
+                    if self.use_tools and self.tools:
+                        tools_description = get_tools_text(self.tools)
                     return UNIFIED_INITIAL_PROMPT_TEMPLATE_QWEN3VL.format(instruction=task_description, tools_description=tools_description)
             else:
                 # Regular templates for non-Qwen3-VL models
@@ -1238,11 +1282,13 @@ class LLM(Controller):
             if self.is_qwen_vl_model:
                 # Use Qwen3-VL specific templates
                 if self.client_type == "unified":
-                    return UNIFIED_FEEDBACK_PROMPT_TEMPLATE_QWEN3VL.format(feedback=feedback)
+                    prefix, suffix = _UNIFIED_FEEDBACK_PARTS_QWEN3VL
+                    return prefix + feedback + suffix
             else:
                 # Regular templates for non-Qwen3-VL models
                 if self.client_type == "unified":
-                    return UNIFIED_FEEDBACK_PROMPT_TEMPLATE.format(feedback=feedback)
+                    prefix, suffix = _UNIFIED_FEEDBACK_PARTS
+                    return prefix + feedback + suffix
         raise ValueError("No task description or feedback provided")
     
     
@@ -1265,22 +1311,18 @@ class LLM(Controller):
             List of tool call dictionaries
         """
         tool_calls = []
-        import re
         
         # First, try to find complete tool_call blocks
-        pattern = r'<tool_call>\s*({.*?})\s*</tool_call>'
-        matches = re.findall(pattern, content, re.DOTALL)
+        matches = self.TOOL_CALL_RE.findall(content)
         
         # If no complete blocks found, try to find JSON before </tool_call> tag
         if not matches:
             # Pattern: JSON object followed by </tool_call>
-            pattern2 = r'({[^{}]*"name"[^{}]*})\s*</tool_call>'
-            matches = re.findall(pattern2, content, re.DOTALL)
+            matches = _TOOL_CALL_FALLBACK_RE.findall(content)
             # If still no matches, try a more flexible pattern
             if not matches:
                 # Find JSON object that might be before </tool_call>
-                pattern3 = r'({[^{}]*"name"[^{}]*"arguments"[^{}]*})'
-                potential_matches = re.findall(pattern3, content, re.DOTALL)
+                potential_matches = _TOOL_CALL_FLEX_RE.findall(content)
                 # Check if there's a </tool_call> tag nearby
                 for potential in potential_matches:
                     # Check if this JSON is followed by </tool_call> within reasonable distance
@@ -1294,22 +1336,22 @@ class LLM(Controller):
         for match in matches:
             try:
                 # First attempt: try to parse directly
-                tool_call_data = json.loads(match)
+                tool_call_data = _json_loads(match)
             except json.JSONDecodeError as e:
                 # Second attempt: try to fix control characters
                 try:
                     fixed_match = self._fix_json_control_chars(match)
-                    tool_call_data = json.loads(fixed_match)
-                    logger.debug(f"Successfully parsed tool call after fixing control characters")
+                    tool_call_data = _json_loads(fixed_match)
+                    logger.debug("Successfully parsed tool call after fixing control characters")
                 except (json.JSONDecodeError, Exception) as e2:
                     logger.error(f"Failed to parse Qwen tool call: {e}")
-                    logger.debug(f"JSON content (first 500 chars): {match[:500]}")
+                    logger.debug("JSON content (first 500 chars): %.500s", match)
                     continue
             
             tool_calls.append({
                 "function": {
                     "name": tool_call_data.get("name"),
-                    "arguments": json.dumps(tool_call_data.get("arguments", {}))
+                    "arguments": _json_dumps(tool_call_data.get("arguments", {}))
                 }
             })
         
@@ -1327,45 +1369,7 @@ class LLM(Controller):
         Returns:
             Fixed JSON string with properly escaped control characters
         """
-        result = []
-        i = 0
-        in_string = False
-        escape_next = False
-        
-        while i < len(json_str):
-            char = json_str[i]
-            
-            if escape_next:
-                result.append(char)
-                escape_next = False
-            elif char == '\\':
-                result.append(char)
-                escape_next = True
-            elif char == '"':
-                result.append(char)
-                in_string = not in_string
-            elif in_string:
-                # Inside a string, escape control characters
-                if char == '\n':
-                    result.append('\\n')
-                elif char == '\r':
-                    result.append('\\r')
-                elif char == '\t':
-                    result.append('\\t')
-                elif char == '\b':
-                    result.append('\\b')
-                elif char == '\f':
-                    result.append('\\f')
-                elif ord(char) < 32:  # Other control characters (0x00-0x1F)
-                    result.append(f'\\u{ord(char):04x}')
-                else:
-                    result.append(char)
-            else:
-                result.append(char)
-            
-            i += 1
-        
-        return ''.join(result)
+        return _JSON_STRING_RE.sub(_escape_json_string, json_str)
     
     def parse_tool_calls_list(self, tool_calls: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Parse a list of tool calls (from Qwen or OpenAI format).
@@ -1385,7 +1389,7 @@ class LLM(Controller):
             try:
                 arguments_str = function.get("arguments", "{}")
                 if isinstance(arguments_str, str):
-                    arguments = json.loads(arguments_str)
+                    arguments = _json_loads(arguments_str)
                 else:
                     arguments = arguments_str
             except json.JSONDecodeError:
@@ -1398,7 +1402,7 @@ class LLM(Controller):
             if tool_call_id:
                 action["tool_call_id"] = tool_call_id
             actions.append(action)
-            logger.debug(f"Tool call: {tool_name} -> Action: {action}")
+            logger.debug("Tool call: %s -> Action: %s", tool_name, action)
         
         # If only one action, return it directly; otherwise return list
         if len(actions) == 1:
@@ -1428,76 +1432,94 @@ class LLM(Controller):
         
         return self.parse_tool_calls_list(tool_calls_list)
 
-    def parse_response(self, response: str) -> Dict[str, Any]:
-        """Parse JSON from the LLM response."""
+    def parse_response(self, response: str, skip_tool_call_scan: bool = False) -> Dict[str, Any]:
+        """Parse JSON from the LLM response.
+        
+        Args:
+            response: The raw assistant message
+            skip_tool_call_scan: Skip text-based tool-call parsing (set by `call()`, which already tried it)
+        """
         # Check if response contains tool_call tags (Qwen format) - if so, try to parse as tool call first
-        if self.use_tools and ("<tool_call>" in response or "</tool_call>" in response):
+        if self.use_tools and not skip_tool_call_scan and "tool_call>" in response:
             tool_calls = self.parse_text_tool_calls(response)
             if tool_calls:
-                logger.debug(f"Found tool_call tags in response, parsed {len(tool_calls)} tool calls")
+                logger.debug("Found tool_call tags in response, parsed %d tool calls", len(tool_calls))
                 parsed_response = self.parse_tool_calls_list(tool_calls)
                 if parsed_response:
                     return parsed_response[0] if isinstance(parsed_response, list) else parsed_response
         
         # Qwen models often prepend a `<think>...</think>` block; only parse content after it
-        try:
-            model_name = getattr(self, "model", "")
-            if isinstance(model_name, str) and "qwen" in model_name.lower():
-                lower = response.lower()
-                if "<think>" in lower:
-                    end_tag = "</think>"
-                    if end_tag in lower:
-                        idx = lower.rfind(end_tag)
-                        response = response[idx + len(end_tag):]
-                    else:
-                        open_idx = lower.find("<think>")
-                        response = response[open_idx + len("<think>"):]
-        except Exception:
-            pass
+        if _classify_model(getattr(self, "model", ""))[0]:
+            think_match = _THINK_PREFIX_RE.match(response)
+            if think_match:
+                response = response[think_match.end():]
         
         # Remove tool_call tags if present (in case they weren't parsed above)
-        if "<tool_call>" in response or "</tool_call>" in response:
+        if "tool_call>" in response:
             # Try to extract JSON from tool_call tags
-            pattern = r'<tool_call>\s*({.*?})\s*</tool_call>'
-            match = re.search(pattern, response, re.DOTALL)
+            match = self.TOOL_CALL_RE.search(response)
             if match:
                 response = match.group(1)
-                logger.debug(f"Extracted JSON from tool_call tags: {response[:200]}...")
+                logger.debug("Extracted JSON from tool_call tags: %.200s...", response)
         
-        # Try to find JSON in markdown code block
-        json_match = re.search(r"```(?:json)?\s*\n?(.*?)\n?```", response, re.DOTALL)
-        if json_match:
-            json_str = json_match.group(1).strip()
-            # logger.debug(f"Found JSON in markdown code block: {json_str}")
-        else:
-            # Try to parse the entire response as JSON
-            json_str = response.strip()
-            logger.debug(f"No markdown code block found, attempting to parse raw response: {json_str}")
+        json_str = response.strip()
+        # A bare JSON object/array (the common case) is parsed as-is, skipping the markdown scan
+        if not (json_str and json_str[0] in "{[" and json_str[-1] in "}]"):
+            # Try to find JSON in markdown code block
+            json_match = _MD_JSON_RE.search(response)
+            if json_match:
+                json_str = json_match.group(1).strip()
+                # logger.debug(f"Found JSON in markdown code block: {json_str}")
+            else:
+                # Try to parse the entire response as JSON
+                logger.debug("No markdown code block found, attempting to parse raw response: %s", json_str)
 
         try:
-            parsed = json.loads(json_str)
-            logger.debug(f"Successfully parsed JSON response with keys: {list(parsed.keys())}")
+            parsed = _json_loads(json_str)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Successfully parsed JSON response with keys: %s", list(parsed.keys()))
             return parsed
         except json.JSONDecodeError as e:
-            # Attempt to auto-fix invalid backslash escapes common in shell commands
-            try:
-                fixed_json_str = re.sub(r"\\(?![\"\\/bfnrtu])", r"\\\\", json_str)
-                parsed = json.loads(fixed_json_str)
-                logger.debug("Successfully parsed JSON after fixing invalid escapes")
-                return parsed
-            except json.JSONDecodeError as e2:
-                logger.error(f"Failed to parse JSON response: {e2}")
-                logger.error(f"Response content: {response[:200]}...")
-                raise ValueError(f"Invalid JSON in LLM response: {e2}")
+            error = e
+            # Attempt to auto-fix invalid backslash escapes common in shell commands;
+            # skip the re-parse when there was nothing to fix
+            fixed_json_str = _fix_invalid_escapes(json_str)
+            if fixed_json_str is not json_str:
+                try:
+                    parsed = _json_loads(fixed_json_str)
+                    logger.debug("Successfully parsed JSON after fixing invalid escapes")
+                    return parsed
+                except json.JSONDecodeError as e2:
+                    error = e2
+            logger.error("Failed to parse JSON response: %s", error)
+            logger.error("Response content: %.200s...", response)
+            raise ValueError(f"Invalid JSON in LLM response: {error}") from error
+
+    def _trim_context(self) -> None:
+        """Drop the oldest messages after the prefix once max_context_messages is exceeded.
+        
+        Prefix entries are never modified, so the request prefix stays byte-identical
+        across calls and provider prompt caching keeps hitting.
+        """
+        max_messages = self.max_context_messages
+        if max_messages <= 0 or len(self.messages) - self._prefix_len <= max_messages:
+            return
+        start = len(self.messages) - max_messages
+        # Tool results must follow the assistant message that issued the tool calls
+        while start < len(self.messages) and self.messages[start].get("role") == "tool":
+            start += 1
+        logger.debug("Trimming %d message(s) from conversation context", start - self._prefix_len)
+        del self.messages[self._prefix_len:start]
 
-    def get_history(self) -> List[Dict[str, str]]:
-        """Get the message history."""
-        return self.messages
+    def get_history(self) -> tuple[Dict[str, Any], ...]:
+        """Get an immutable snapshot of the message history (safe to keep after `clear_history`)."""
+        return tuple(self.messages)
 
     def clear_history(self) -> None:
         """Clear the message history."""
-        logger.debug(f"Clearing message history ({len(self.messages)} messages removed)")
-        self.messages = []
+        logger.debug("Clearing message history (%d messages removed)", len(self.messages))
+        self.messages.clear()
+        self._prefix_len = 0
         # Note: Cost tracking is NOT reset on clear_history to maintain cumulative cost
 
     def get_cost_stats(self) -> Dict[str, Any]:
@@ -1506,15 +1528,29 @@ class LLM(Controller):
         Returns:
             Dictionary with cost and token usage information
         """
-        return {
-            "total_cost_usd": round(self.total_cost, 6),
-            "total_input_tokens": self.total_input_tokens,
-            "total_output_tokens": self.total_output_tokens,
-            "total_cached_tokens": self.total_cached_tokens,
-            "total_tokens": self.total_input_tokens + self.total_output_tokens,
-            "api_calls": self.api_calls,
-            "model": self.model
-        }
+        stats = self._cost_stats
+        # Only re-round the cost when it changed since the last call
+        if self.total_cost != self._cost_stats_total:
+            self._cost_stats_total = self.total_cost
+            stats["total_cost_usd"] = round(self.total_cost, 6)
+        stats["total_input_tokens"] = self.total_input_tokens
+        stats["total_output_tokens"] = self.total_output_tokens
+        stats["total_cached_tokens"] = self.total_cached_tokens
+        stats["total_tokens"] = self.total_input_tokens + self.total_output_tokens
+        stats["api_calls"] = self.api_calls
+        stats["model"] = self.model
+        return stats.copy()
+    
+    def flush_cost(self) -> None:
+        """Log cumulative cost at INFO if any API calls were only logged at DEBUG."""
+        if self.api_calls == self._cost_logged_calls:
+            return
+        self._cost_logged_calls = self.api_calls
+        logger.info(
+            "API cost: $%.6f over %d calls | Tokens: %d input, %d output, %d cached",
+            self.total_cost, self.api_calls,
+            self.total_input_tokens, self.total_output_tokens, self.total_cached_tokens,
+        )
     
     def reset_cost_tracking(self) -> None:
         """Reset cost tracking statistics."""
@@ -1524,8 +1560,17 @@ class LLM(Controller):
         self.total_output_tokens = 0
         self.total_cached_tokens = 0
         self.api_calls = 0
+        self._cost_logged_calls = 0
         self.last_think = None
     
+    @classmethod
+    def close_shared_clients(cls) -> None:
+        """Close and forget all shared OpenAI clients."""
+        clients = list(_CLIENT_CACHE.values())
+        _CLIENT_CACHE.clear()
+        for client in clients:
+            client.close()
+    
     def get_last_think(self) -> str | None:
         """Get the last think/reasoning content for visualization.
         
@@ -1540,7 +1585,7 @@ class LLM(Controller):
             return
         if content is None:
             content = ""
-        if not isinstance(content, str):
+        elif type(content) is not str:
             content = str(content)
         tool_message = {
             "role": "tool",
@@ -1548,7 +1593,11 @@ class LLM(Controller):
             "content": content
         }
         self.messages.append(tool_message)
-        logger.debug(f"Added tool message for {tool_call_id}: {content[:200]}")
+        logger.debug("Added tool message for %s: %.200s", tool_call_id, content)
+
+
+# Separator line for the Human controller's console prompt
+_BANNER = "=" * 80
 
 
 class Human(Controller):
@@ -1568,17 +1617,14 @@ class Human(Controller):
         Returns:
             Dictionary with command and explanation
         """
-        logger.debug(f"Prompting user with: {prompt[:100]}...")
-        print("\n" + "=" * 80)
-        print("PROMPT:")
-        print("=" * 80)
-        print(prompt)
-        print("=" * 80)
-        print("Please provide your response below:")
-        print("=" * 80)
+        logger.debug("Prompting user with: %.100s...", prompt)
+        sys.stdout.write(
+            f"\n{_BANNER}\nPROMPT:\n{_BANNER}\n{prompt}\n{_BANNER}\n"
+            f"Please provide your response below:\n{_BANNER}\n"
+        )
 
         user_input = input("> ").strip()
-        logger.debug(f"User provided input: {user_input[:100]}...")
+        logger.debug("User provided input: %.100s...", user_input)
 
         # Parse and return the structured response
         parsed_response = self.parse_response(user_input)
@@ -1600,11 +1646,11 @@ class Human(Controller):
         """
         if task_description is not None:
             prompt = f"Task: {task_description}\n\nPlease provide a shell command to solve this task."
-            logger.debug(f"Built initial prompt for task: {prompt}")
+            logger.debug("Built initial prompt for task: %s", prompt)
             return prompt
         if feedback is not None:
             prompt = f"Feedback: {feedback}\n\nPlease provide the next shell command."
-            logger.debug(f"Built feedback prompt: {prompt}")
+            logger.debug("Built feedback prompt: %s", prompt)
             return prompt
         raise ValueError("No task description or feedback provided")
 
@@ -1618,5 +1664,5 @@ class Human(Controller):
             Dictionary with command and explanation
         """
         command = response.strip()
-        logger.debug(f"Parsed user command: {command[:100]}...")
+        logger.debug("Parsed user command: %.100s...", command)
         return {"command": command, "explanation": "User provided command"}
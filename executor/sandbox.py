@@ -2,12 +2,25 @@
 Helper functions for executor operations.
 """
 
+import io
+import os
+import base64
 import time
+import random
+import asyncio
+import threading
+import shutil
 import subprocess
 import json
-from typing import Any, Dict, Optional
+import logging
+from collections import deque
+from itertools import islice
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
 from pathlib import Path
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 from .utils import retry_request, validate_response, get_logger, colorize
 
 from agent_sandbox import Sandbox
@@ -16,9 +29,245 @@ from agent_sandbox.browser import (
     Action_MoveTo, Action_MoveRel, Action_Wait, Action_DoubleClick, Action_RightClick,
     Action_DragTo, Action_DragRel, Action_Hotkey, Action_KeyDown, Action_KeyUp
 )
+from agent_sandbox.core.api_error import ApiError
+
+try:
+    from playwright.async_api import async_playwright
+except ImportError:
+    async_playwright = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = get_logger("sandbox")
 
+# Health-check polling backoff while a container starts (seconds)
+HEALTH_CHECK_BACKOFF_BASE = 0.25
+HEALTH_CHECK_BACKOFF_CAP = 5.0
+# Max concurrent health-check probes while waiting for a container to start
+HEALTH_CHECK_PROBES = 3
+
+# Attributes reported for each element matched by _dom_query_selector
+_ATTR_NAMES = ("id", "class", "name", "type", "href", "role", "aria-label")
+
+# str_replace_editor command names (the SDK's Command type is a string Literal) and the
+# optional arguments forwarded to the SDK
+_EDITOR_COMMANDS = ("view", "create", "str_replace", "insert", "undo_edit")
+_EDITOR_OPTIONAL_KEYS = ("file_text", "old_str", "new_str", "insert_line", "view_range")
+
+# Max chars of a file shown by file_read
+FILE_READ_MAX_CHARS = 5000
+
+# Max entries named in file_list feedback
+FILE_LIST_MAX_ENTRIES = 50
+
+# Max chars of code_execute stdout/stderr passed back in feedback (each stream)
+CODE_OUTPUT_MAX_CHARS = 64_000
+
+# Default number of action/feedback entries kept in a client's execution history
+DEFAULT_HISTORY_LIMIT = 500
+
+# Lines of docker compose output kept for error reporting
+COMPOSE_LOG_TAIL_LINES = 200
+
+# SDK HTTP client: seconds an idle keep-alive connection stays pooled. httpx's 5s
+# default is shorter than a typical LLM turn, so connections expired between actions.
+SDK_KEEPALIVE_EXPIRY = 120.0
+SDK_TIMEOUT = 60.0
+
+# Max seconds to wait for a coroutine submitted to the background event loop
+ASYNC_CALL_TIMEOUT = 60
+
+# Long-lived event loop on a daemon thread; all Playwright coroutines run here
+_async_loop: asyncio.AbstractEventLoop | None = None
+_async_loop_lock = threading.Lock()
+
+# One Playwright driver (a Node subprocess) shared by every browser client; lives on _async_loop
+_playwright_driver = None
+_playwright_driver_lock = asyncio.Lock()
+
+
+def _get_async_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared background event loop, starting it on first use."""
+    global _async_loop
+    with _async_loop_lock:
+        if _async_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="sandbox-event-loop", daemon=True).start()
+            _async_loop = loop
+        return _async_loop
+
+
+def _create_sdk_client(base_url: str) -> Sandbox:
+    """Create an AIO Sandbox SDK client whose connection pool survives between agent turns."""
+    http_client = httpx.Client(
+        timeout=SDK_TIMEOUT,
+        follow_redirects=True,
+        limits=httpx.Limits(max_keepalive_connections=16, max_connections=32, keepalive_expiry=SDK_KEEPALIVE_EXPIRY),
+    )
+    return Sandbox(base_url=base_url, httpx_client=http_client)
+
+
+# Feedback serialization for debug logs and history spill: orjson when installed,
+# falling back to the stdlib for anything orjson rejects (e.g. non-str keys)
+if orjson is not None:
+    def _dumps_indented(obj: Any) -> str:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+        except orjson.JSONEncodeError:
+            return json.dumps(obj, indent=2)
+
+    def _dumps_line(obj: Any) -> bytes:
+        try:
+            return orjson.dumps(obj, default=str, option=orjson.OPT_APPEND_NEWLINE)
+        except orjson.JSONEncodeError:
+            return (json.dumps(obj, default=str) + "\n").encode()
+else:
+    def _dumps_indented(obj: Any) -> str:
+        return json.dumps(obj, indent=2)
+
+    def _dumps_line(obj: Any) -> bytes:
+        return (json.dumps(obj, default=str) + "\n").encode()
+
+
+def _log_feedback(feedback: Dict[str, Any]) -> None:
+    """Debug-log an observation; skips serializing it entirely when DEBUG is off."""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if feedback.get("image_base64"):
+        feedback = {**feedback, "image_base64": f"<{len(feedback['image_base64'])} chars>"}
+    logger.debug("Feedback (OBSERVATION): \n%s", colorize(_dumps_indented(feedback), "YELLOW"))
+
+
+def _truncate(value: str, max_chars: int) -> str:
+    """Cut value to max_chars, marking the cut with an ellipsis."""
+    return value if len(value) <= max_chars else value[:max_chars] + "..."
+
+
+async def _get_playwright():
+    """Return the shared Playwright driver, starting it on first use.
+
+    Must run on the background event loop. Each client opens its own CDP connection
+    through it, so starting a task no longer spawns a new driver process.
+    """
+    global _playwright_driver
+    async with _playwright_driver_lock:
+        if _playwright_driver is None:
+            if async_playwright is None:
+                raise ImportError("playwright is required for DOM-based browser actions")
+            _playwright_driver = await async_playwright().start()
+        return _playwright_driver
+
+
+def _cap_output(text: str, max_chars: int = CODE_OUTPUT_MAX_CHARS) -> str:
+    """Keep the first max_chars of a command's output, noting the full length when cut."""
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}\n... (truncated, total {len(text)} chars)"
+
+
+def _lower_key(key):
+    """Lowercase a key name for API compatibility, leaving non-strings alone."""
+    return key.lower() if isinstance(key, str) else key
+
+
+def _build_click(d: Dict[str, Any]) -> Action_Click:
+    return Action_Click(x=d.get("x"), y=d.get("y"), button=d.get("button", "left"), num_clicks=d.get("num_clicks", 1))
+
+
+def _build_type(d: Dict[str, Any]) -> Action_Typing:
+    return Action_Typing(text=d.get("text"), use_clipboard=d.get("use_clipboard", True))
+
+
+def _build_press(d: Dict[str, Any]) -> Action_Press:
+    return Action_Press(key=_lower_key(d.get("key", "")))
+
+
+def _build_key_down(d: Dict[str, Any]) -> Action_KeyDown:
+    return Action_KeyDown(key=_lower_key(d.get("key", "")))
+
+
+def _build_key_up(d: Dict[str, Any]) -> Action_KeyUp:
+    return Action_KeyUp(key=_lower_key(d.get("key", "")))
+
+
+def _build_hotkey(d: Dict[str, Any]) -> Action_Hotkey:
+    return Action_Hotkey(keys=[_lower_key(k) for k in d.get("keys", [])])
+
+
+def _build_scroll(d: Dict[str, Any]) -> Action_Scroll:
+    return Action_Scroll(dx=d.get("dx", 0), dy=d.get("dy", 0))
+
+
+def _build_move_to(d: Dict[str, Any]) -> Action_MoveTo:
+    return Action_MoveTo(x=d.get("x"), y=d.get("y"))
+
+
+def _build_move_rel(d: Dict[str, Any]) -> Action_MoveRel:
+    return Action_MoveRel(x_offset=d.get("x_offset"), y_offset=d.get("y_offset"))
+
+
+def _build_drag_to(d: Dict[str, Any]) -> Action_DragTo:
+    return Action_DragTo(x=d.get("x"), y=d.get("y"))
+
+
+def _build_drag_rel(d: Dict[str, Any]) -> Action_DragRel:
+    return Action_DragRel(x_offset=d.get("x_offset"), y_offset=d.get("y_offset"))
+
+
+def _build_wait(d: Dict[str, Any]) -> Action_Wait:
+    return Action_Wait(duration=d.get("duration"))
+
+
+# Maps browser action_type to a builder for the corresponding SDK action object
+_ACTION_BUILDERS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    "browser_click": _build_click,
+    "browser_type": _build_type,
+    "browser_press": _build_press,
+    "browser_key_down": _build_key_down,
+    "browser_key_up": _build_key_up,
+    "browser_hotkey": _build_hotkey,
+    "browser_scroll": _build_scroll,
+    "browser_move_to": _build_move_to,
+    "browser_move_rel": _build_move_rel,
+    "browser_drag_to": _build_drag_to,
+    "browser_drag_rel": _build_drag_rel,
+    "browser_wait": _build_wait,
+}
+
+
+class ExecutionHistory(deque):
+    """Bounded action/feedback history; evicted entries can be spilled to a JSONL file.
+
+    Stored entries keep only the length of any image_base64 payload; the full image
+    stays in the feedback returned to the caller.
+    """
+
+    def __init__(self, maxlen: int, spill_path: str | None = None):
+        super().__init__((), maxlen)
+        self.spill_path = spill_path
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        feedback = entry.get("feedback")
+        if isinstance(feedback, dict) and feedback.get("image_base64"):
+            entry = {**entry, "feedback": {**feedback, "image_base64": f"<{len(feedback['image_base64'])} chars>"}}
+        if self.spill_path and len(self) == self.maxlen:
+            self._spill(self[0])
+        super().append(entry)
+
+    def extend(self, entries) -> None:
+        for entry in entries:
+            self.append(entry)
+
+    def _spill(self, entry: Dict[str, Any]) -> None:
+        try:
+            with open(self.spill_path, "ab") as f:
+                f.write(_dumps_line(entry))
+        except OSError as e:
+            logger.warning(f"Failed to spill execution history entry to {self.spill_path}: {e}")
+
 
 class SandboxClient:
     """Client for communicating with the agent server."""
@@ -35,11 +284,32 @@ class SandboxClient:
         self.container_id: Optional[str] = None
         self.task_name: Optional[str] = None
         self.task_dir: Optional[str] = None
+        # Oldest entries are dropped once a client's execution history reaches this size
+        self.history_limit: int = sandbox_config.get("history_limit", DEFAULT_HISTORY_LIMIT)
+        # Optional JSONL file that receives entries evicted from the execution history
+        self.history_spill_path: Optional[str] = sandbox_config.get("history_spill_path")
+
+        # Resolve the docker CLI once instead of walking PATH on every subprocess call
+        self._docker_bin = shutil.which("docker") or "docker"
+        self._compose_env: Dict[str, str] | None = None
+
+        # Serializes aget_feedback calls; a sandbox executes one action at a time
+        self._feedback_lock = threading.Lock()
+
+        # Keep-alive connection pool for health checks and agent server requests
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=16, max_retries=0)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def close(self) -> None:
+        """Close pooled HTTP connections to the agent server."""
+        self._session.close()
 
     def health_check(self) -> bool:
         """Check if the agent server is running."""
         try:
-            response = requests.get(f"{self.base_url}/v1/sandbox", timeout=5)
+            response = self._session.get(f"{self.base_url}/v1/sandbox", timeout=5)
             return response.status_code == 200
         except Exception:
             return False
@@ -55,10 +325,39 @@ class SandboxClient:
         """
         raise NotImplementedError("Not implemented")
 
+    def _record_error(self, action: Dict[str, Any], error: Exception, what: str) -> Dict[str, Any]:
+        """Log a failed action, record it in the execution history, and return its error feedback.
+
+        The traceback is only formatted when DEBUG logging is enabled.
+        """
+        logger.error("Error executing %s: %s", what, error)
+        logger.debug("Full traceback:", exc_info=error)
+        feedback = {"done": False, "message": f"Error: {error}"}
+        self.execution_history.append({"action": action, "feedback": feedback})
+        return feedback
+
+    async def aget_feedback(self, action: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of get_feedback, for orchestrators that drive several sandboxes at once.
+
+        The SDK calls are blocking, so the action runs in a worker thread; actions sent
+        to the same client are still executed one at a time.
+
+        Args:
+            action: The action/command to execute
+
+        Returns:
+            Dictionary with done status and feedback message
+        """
+        def run():
+            with self._feedback_lock:
+                return self.get_feedback(action)
+
+        return await asyncio.to_thread(run)
+
     def send_request(self, endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """Send request to agent server."""
         def _request():
-            response = requests.post(
+            response = self._session.post(
                 f"{self.base_url}/{endpoint.lstrip('/')}",
                 json=data,
                 headers={"Content-Type": "application/json"},
@@ -68,6 +367,81 @@ class SandboxClient:
 
         return retry_request(_request)
 
+    def _run_compose(self, docker_compose_path: str, args: list[str], timeout: int) -> tuple[int, str]:
+        """Run a docker compose command, streaming its output instead of buffering all of it.
+
+        Only the last COMPOSE_LOG_TAIL_LINES lines (stdout and stderr merged) are kept,
+        which bounds memory on verbose image builds.
+
+        Returns:
+            Tuple of (return_code, output_tail)
+
+        Raises:
+            subprocess.TimeoutExpired: If the command does not finish within timeout seconds
+        """
+        tail = deque(maxlen=COMPOSE_LOG_TAIL_LINES)
+        proc = subprocess.Popen(
+            [self._docker_bin, "compose", "-f", docker_compose_path, *args],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=-1,
+            env=self._compose_env,
+        )
+        # Drain on a thread so the pipe never fills up while we wait with a timeout
+        reader = threading.Thread(target=tail.extend, args=(proc.stdout,), daemon=True)
+        reader.start()
+        try:
+            returncode = proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+            raise
+        finally:
+            # A leftover child may still hold the pipe open; don't block on it
+            reader.join(timeout=1)
+            if not reader.is_alive():
+                proc.stdout.close()
+        return returncode, "".join(tail)
+
+    def _wait_until_healthy(self, wait_time: float) -> bool:
+        """Poll health_check until it succeeds or wait_time seconds pass.
+
+        Polls with capped exponential backoff and full jitter. Up to HEALTH_CHECK_PROBES
+        probes may be in flight at once, so a probe stuck on a half-started server
+        doesn't hold up the next one; the first success wins.
+        """
+        start = time.monotonic()
+        deadline = start + wait_time
+        backoff = HEALTH_CHECK_BACKOFF_BASE
+        pool = ThreadPoolExecutor(max_workers=HEALTH_CHECK_PROBES, thread_name_prefix="health-check")
+        pending = set()
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                if len(pending) < HEALTH_CHECK_PROBES:
+                    pending.add(pool.submit(self.health_check))
+                delay = min(random.uniform(0, min(HEALTH_CHECK_BACKOFF_CAP, backoff)), remaining)
+                logger.debug(f"Docker environment not ready yet. Retrying in {delay:.2f}s ({time.monotonic() - start:.1f}/{wait_time} seconds)")
+                # Return as soon as any in-flight probe succeeds; otherwise sleep out the delay
+                wake = time.monotonic() + delay
+                while pending:
+                    timeout = wake - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                    if any(future.result() for future in done):
+                        return True
+                timeout = wake - time.monotonic()
+                if timeout > 0:
+                    time.sleep(timeout)
+                backoff *= 2
+        finally:
+            # Don't block on probes still waiting for their HTTP timeout
+            pool.shutdown(wait=False, cancel_futures=True)
+
     def create_docker_environment(self, task: Dict[str, Any], wait_time: int = 60) -> bool:
         """
         Create and start an agent server container using task's docker-compose.yaml.
@@ -98,49 +472,32 @@ class SandboxClient:
                 "HOST_PORT": str(self.port)
             }
 
-            # Build without cache and start using docker-compose
-            logger.info(f"Building and starting container for task '{task_name}' using docker-compose")
-
-            # Build the image without cache
-            build_result = subprocess.run(
-                ["docker", "compose", "-f", docker_compose_path, "build", "--no-cache"],
-                capture_output=True,
-                text=True,
-                timeout=120,
-                env={**subprocess.os.environ, **env}
-            )
+            # Built once per container; reused by every compose call for this task
+            self._compose_env = {**os.environ, **env}
 
-            if build_result.returncode != 0:
-                logger.error(f"Failed to build container with docker-compose: {build_result.stderr}")
-                return False
+            # Build (reusing cached layers) and start using docker-compose
+            logger.info(f"Building and starting container for task '{task_name}' using docker-compose")
 
-            # Start the container
-            result = subprocess.run(
-                ["docker", "compose", "-f", docker_compose_path, "up", "-d"],
-                capture_output=True,
-                text=True,
-                timeout=120,
-                env={**subprocess.os.environ, **env}
-            )
+            # Full rebuild without cache only when the task asks for it
+            if task.get("force_rebuild"):
+                returncode, output = self._run_compose(docker_compose_path, ["build", "--no-cache"], timeout=120)
+                if returncode != 0:
+                    logger.error(f"Failed to build container with docker-compose: {output}")
+                    return False
 
-            if result.returncode != 0:
-                logger.error(f"Failed to start container with docker-compose: {result.stderr}")
+            # Build if needed and start the container in one compose invocation
+            returncode, output = self._run_compose(docker_compose_path, ["up", "--build", "-d"], timeout=240)
+            if returncode != 0:
+                logger.error(f"Failed to build and start container with docker-compose: {output}")
                 return False
 
             # Extract container ID from docker-compose
             self.container_id = env["TASK_DOCKER_CONTAINER_NAME"]
             logger.info(f"Container started successfully. Container name: {self.container_id}")
 
-            # Wait for server to be ready
-            waited = 0
-            while waited < wait_time:
-                if self.health_check():
-                    logger.info("Docker environment ready")
-                    return True
-                else:
-                    waited += 5
-                    logger.info(f"Docker environment not ready yet. Waiting ... ({waited}/{wait_time} seconds)")
-                    time.sleep(5)
+            if self._wait_until_healthy(wait_time):
+                logger.info("Docker environment ready")
+                return True
 
             logger.error(f"Docker environment failed to become ready within timeout of {wait_time} seconds")
             return False
@@ -165,21 +522,40 @@ class SandboxClient:
         Returns:
             True if successful, False otherwise
         """
+        return self.copy_many_to_container([(host_path, container_path)])
+
+    def copy_many_to_container(self, pairs: list[tuple[str, str]]) -> bool:
+        """
+        Copy several files or directories from host to running container.
+
+        All missing parent directories are created with a single `docker exec`,
+        so copying N paths costs N + 1 docker invocations instead of 2N.
+
+        Args:
+            pairs: List of (host_path, container_path) tuples
+
+        Returns:
+            True if every copy succeeded, False otherwise (stops at the first failure)
+        """
         try:
             if not self.container_id:
                 logger.error("No container running. Call create_docker_environment first.")
                 return False
 
-            host_file = Path(host_path)
-            if not host_file.exists():
-                logger.error(f"Source path does not exist: {host_path}")
-                return False
+            for host_path, _ in pairs:
+                if not Path(host_path).exists():
+                    logger.error(f"Source path does not exist: {host_path}")
+                    return False
 
-            # Create parent directory in container if needed
-            parent_dir = str(Path(container_path).parent)
-            if parent_dir and parent_dir != "/":
+            # Create parent directories in container if needed
+            parent_dirs = []
+            for _, container_path in pairs:
+                parent_dir = str(Path(container_path).parent)
+                if parent_dir and parent_dir != "/" and parent_dir not in parent_dirs:
+                    parent_dirs.append(parent_dir)
+            if parent_dirs:
                 mkdir_result = subprocess.run(
-                    ["docker", "exec", self.container_id, "mkdir", "-p", parent_dir],
+                    [self._docker_bin, "exec", self.container_id, "mkdir", "-p", *parent_dirs],
                     capture_output=True,
                     text=True,
                     timeout=30
@@ -188,22 +564,23 @@ class SandboxClient:
                     logger.error(f"Failed to create parent directory: {mkdir_result.stderr}")
                     return False
 
-            logger.info(f"Copying {host_path} to container {self.container_id}:{container_path}")
+            for host_path, container_path in pairs:
+                logger.info(f"Copying {host_path} to container {self.container_id}:{container_path}")
 
-            # Use docker cp to copy the file/directory
-            result = subprocess.run(
-                ["docker", "cp", str(host_file), f"{self.container_id}:{container_path}"],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
+                # Use docker cp to copy the file/directory
+                result = subprocess.run(
+                    [self._docker_bin, "cp", str(Path(host_path)), f"{self.container_id}:{container_path}"],
+                    capture_output=True,
+                    text=True,
+                    timeout=30
+                )
 
-            if result.returncode == 0:
+                if result.returncode != 0:
+                    logger.error(f"Failed to copy file to container: {result.stderr}")
+                    return False
                 logger.info(f"Successfully copied {host_path} to container")
-                return True
-            else:
-                logger.error(f"Failed to copy file to container: {result.stderr}")
-                return False
+
+            return True
 
         except subprocess.TimeoutExpired:
             logger.error("Docker copy command timed out")
@@ -220,13 +597,15 @@ class SandboxClient:
         Returns:
             True if successful, False otherwise
         """
+        # Connections to the container being torn down can't be reused
+        self.close()
         try:
             if self.task_dir and self.task_name:
                 docker_compose_path = f"{self.task_dir}/docker-compose.yaml"
                 logger.info(f"Stopping container for task '{self.task_name}' using docker-compose")
 
                 result = subprocess.run(
-                    ["docker", "compose", "-f", docker_compose_path, "down"],
+                    [self._docker_bin, "compose", "-f", docker_compose_path, "down"],
                     capture_output=True,
                     text=True,
                     timeout=30
@@ -252,16 +631,28 @@ class SandboxClient:
 class BrowserSandboxClient(SandboxClient):
     """Client for communicating with the agent server for browser actions."""
 
+    # CDP browser connection, kept open across DOM calls.
+    # Class-level defaults so instances created via __new__ (see UnifiedSandboxClient) work too.
+    _browser = None
+    # Browser info (CDP URL, viewport); stable for the container's lifetime
+    _browser_info = None
+
     def __init__(self, sandbox_config: Dict[str, Any] | None = None, **kwargs):
         super().__init__(sandbox_config, **kwargs)
         # Track all actions and their feedbacks
-        self.execution_history: list[Dict[str, Any]] = []
+        self.execution_history: ExecutionHistory = ExecutionHistory(self.history_limit, self.history_spill_path)
         self.sdk_client: Optional[Sandbox] = None
 
+    def close(self) -> None:
+        """Close pooled HTTP connections and the cached CDP browser connection."""
+        super().close()
+        self._close_browser()
+        self._browser_info = None
+
     def _initialize_sdk_client(self) -> None:
         """Initialize the AIO Sandbox SDK client."""
         if self.sdk_client is None:
-            self.sdk_client = Sandbox(base_url=self.base_url)
+            self.sdk_client = _create_sdk_client(self.base_url)
             logger.debug(f"Initialized Sandbox SDK client with base_url: {self.base_url}")
 
     def _construct_browser_action(self, action_data: Dict[str, Any]):
@@ -274,65 +665,10 @@ class BrowserSandboxClient(SandboxClient):
             Browser action object
         """
         action_type = action_data.get("action_type")
-        
-        if action_type == "browser_click":
-            return Action_Click(
-                x=action_data.get("x"),
-                y=action_data.get("y"),
-                button=action_data.get("button", "left"),
-                num_clicks=action_data.get("num_clicks", 1)
-            )
-        elif action_type == "browser_type":
-            return Action_Typing(
-                text=action_data.get("text"),
-                use_clipboard=action_data.get("use_clipboard", True)
-            )
-        elif action_type == "browser_press":
-            # Convert key to lowercase for API compatibility
-            key = action_data.get("key", "")
-            return Action_Press(key=key.lower() if isinstance(key, str) else key)
-        elif action_type == "browser_key_down":
-            # Convert key to lowercase for API compatibility
-            key = action_data.get("key", "")
-            return Action_KeyDown(key=key.lower() if isinstance(key, str) else key)
-        elif action_type == "browser_key_up":
-            # Convert key to lowercase for API compatibility
-            key = action_data.get("key", "")
-            return Action_KeyUp(key=key.lower() if isinstance(key, str) else key)
-        elif action_type == "browser_hotkey":
-            # Convert all keys to lowercase for API compatibility
-            keys = action_data.get("keys", [])
-            keys_lower = [k.lower() if isinstance(k, str) else k for k in keys]
-            return Action_Hotkey(keys=keys_lower)
-        elif action_type == "browser_scroll":
-            return Action_Scroll(
-                dx=action_data.get("dx", 0),
-                dy=action_data.get("dy", 0)
-            )
-        elif action_type == "browser_move_to":
-            return Action_MoveTo(
-                x=action_data.get("x"),
-                y=action_data.get("y")
-            )
-        elif action_type == "browser_move_rel":
-            return Action_MoveRel(
-                x_offset=action_data.get("x_offset"),
-                y_offset=action_data.get("y_offset")
-            )
-        elif action_type == "browser_drag_to":
-            return Action_DragTo(
-                x=action_data.get("x"),
-                y=action_data.get("y")
-            )
-        elif action_type == "browser_drag_rel":
-            return Action_DragRel(
-                x_offset=action_data.get("x_offset"),
-                y_offset=action_data.get("y_offset")
-            )
-        elif action_type == "browser_wait":
-            return Action_Wait(duration=action_data.get("duration"))
-        else:
+        builder = _ACTION_BUILDERS.get(action_type)
+        if builder is None:
             raise ValueError(f"Unsupported action type: {action_type}")
+        return builder(action_data)
 
     def _take_screenshot(self) -> tuple[str, str]:
         """Take a screenshot and return base64 encoded string and status message.
@@ -341,10 +677,7 @@ class BrowserSandboxClient(SandboxClient):
             Tuple of (base64_encoded_image, status_message)
         """
         try:
-            import base64
-            screenshot_data = b""
-            for chunk in self.sdk_client.browser.screenshot():
-                screenshot_data += chunk
+            screenshot_data = b"".join(self.sdk_client.browser.screenshot())
             
             # Encode to base64
             base64_image = base64.b64encode(screenshot_data).decode('utf-8')
@@ -363,6 +696,12 @@ class BrowserSandboxClient(SandboxClient):
         self._initialize_sdk_client()
         return self._take_screenshot()
     
+    def _get_browser_data(self):
+        """Return the browser info data (CDP URL, viewport), fetching it once per container."""
+        if self._browser_info is None:
+            self._browser_info = self.sdk_client.browser.get_info().data
+        return self._browser_info
+
     def _get_browser_info(self) -> str:
         """Get browser information including CDP URL and viewport.
         
@@ -370,15 +709,16 @@ class BrowserSandboxClient(SandboxClient):
             Browser info as formatted string
         """
         try:
-            info = self.sdk_client.browser.get_info()
-            browser_data = info.data
+            browser_data = self._get_browser_data()
             return f"Browser Info:\nCDP URL: {browser_data.cdp_url}\nViewport: {browser_data.viewport.width}x{browser_data.viewport.height}"
         except Exception as e:
             logger.error(f"Failed to get browser info: {e}")
             return f"Failed to get browser info: {str(e)}"
     
     def _run_async(self, coro):
-        """Run an async coroutine, handling both sync and async contexts.
+        """Run an async coroutine on the shared background event loop and wait for it.
+        
+        Works from both sync and async callers without creating a thread or loop per call.
         
         Args:
             coro: Coroutine to run
@@ -386,58 +726,69 @@ class BrowserSandboxClient(SandboxClient):
         Returns:
             Result of the coroutine
         """
-        import asyncio
+        future = asyncio.run_coroutine_threadsafe(coro, _get_async_loop())
         try:
-            # Try to get the current event loop
-            loop = asyncio.get_running_loop()
-            # If we're in an async context, we need to use a different approach
-            # Create a new event loop in a thread
-            import concurrent.futures
-            import threading
-            
-            def run_in_thread():
-                new_loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(new_loop)
-                try:
-                    return new_loop.run_until_complete(coro)
-                finally:
-                    new_loop.close()
-            
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(run_in_thread)
-                return future.result(timeout=60)  # Increased timeout for complex pages
-        except RuntimeError:
-            # No running event loop, use asyncio.run()
-            return asyncio.run(coro)
+            return future.result(timeout=ASYNC_CALL_TIMEOUT)  # Generous timeout for complex pages
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    async def _get_browser(self):
+        """Return the cached CDP browser connection, connecting on first use or after a disconnect.
+        
+        Must run on the background event loop (via `_run_async`).
+        """
+        if self._browser is not None:
+            if self._browser.is_connected():
+                return self._browser
+            # The browser went away; its CDP URL may have changed too
+            self._browser_info = None
+        await self._disconnect_browser()
+
+        playwright = await _get_playwright()
+        # get_info() is a blocking HTTP call; keep it off the shared loop so other clients aren't stalled
+        browser_info = await asyncio.to_thread(self._get_browser_data)
+        self._browser = await playwright.chromium.connect_over_cdp(browser_info.cdp_url)
+        return self._browser
+
+    async def _disconnect_browser(self) -> None:
+        """Drop the cached CDP connection; the shared Playwright driver keeps running."""
+        browser, self._browser = self._browser, None
+        if browser is not None:
+            # Closing the Playwright client disconnects but does not shut down the remote browser
+            await browser.close()
+
+    def _close_browser(self) -> None:
+        """Close the cached CDP browser connection, if any."""
+        if self._browser is None:
+            return
+        try:
+            self._run_async(self._disconnect_browser())
+        except Exception as e:
+            logger.warning(f"Failed to close browser connection: {e}")
+
+    async def _get_page(self, browser):
+        """Return the active page of a connected browser, creating one if needed."""
+        context = browser.contexts[0] if browser.contexts else await browser.new_context()
+        return context.pages[0] if context.pages else await context.new_page()
 
     def _with_page(self, func, wait_timeout: int = 5000):
-        """Connect to the running browser via CDP and run an async function on the active page.
+        """Run an async function on the active page of the running browser (over a cached CDP connection).
         
         Args:
             func: Async function that takes a page and returns a result
             wait_timeout: Timeout in ms for waiting for page load (default 5000ms, use 0 to skip wait)
         """
-        import asyncio
-        from playwright.async_api import async_playwright
-
         async def runner():
-            browser_info = self.sdk_client.browser.get_info().data
-            async with async_playwright() as p:
-                browser = await p.chromium.connect_over_cdp(browser_info.cdp_url)
+            page = await self._get_page(await self._get_browser())
+            # Use shorter timeout for DOM operations on already-loaded pages
+            if wait_timeout > 0:
                 try:
-                    context = browser.contexts[0] if browser.contexts else await browser.new_context()
-                    page = context.pages[0] if context.pages else await context.new_page()
-                    # Use shorter timeout for DOM operations on already-loaded pages
-                    if wait_timeout > 0:
-                        try:
-                            await page.wait_for_load_state("domcontentloaded", timeout=wait_timeout)
-                        except Exception:
-                            # If page is already loaded or timeout, continue anyway
-                            pass
-                    return await func(page)
-                finally:
-                    # Closing the Playwright client disconnects but does not shut down the remote browser
-                    await browser.close()
+                    await page.wait_for_load_state("domcontentloaded", timeout=wait_timeout)
+                except Exception:
+                    # If page is already loaded or timeout, continue anyway
+                    pass
+            return await func(page)
 
         return self._run_async(runner())
 
@@ -445,7 +796,11 @@ class BrowserSandboxClient(SandboxClient):
         """Return page text (innerText of body)."""
         try:
             async def op(page):
-                return await page.inner_text("body")
+                # Truncate in the page so only what we keep crosses CDP
+                return await page.evaluate(
+                    "(n) => document.body ? document.body.innerText.slice(0, n) : ''",
+                    max_chars + 1,
+                )
 
             text = self._with_page(lambda page: op(page), wait_timeout=5000)
             if text is None:
@@ -461,7 +816,16 @@ class BrowserSandboxClient(SandboxClient):
         """Return page HTML (page.content)."""
         try:
             async def op(page):
-                return await page.content()
+                # Truncate in the page so the full DOM serialization never crosses CDP
+                return await page.evaluate(
+                    """(n) => {
+                        const root = document.documentElement;
+                        if (!root) return "";
+                        const doctype = document.doctype ? new XMLSerializer().serializeToString(document.doctype) : "";
+                        return (doctype + root.outerHTML).slice(0, n);
+                    }""",
+                    max_chars + 1,
+                )
 
             html = self._with_page(lambda page: op(page), wait_timeout=5000)
             if html is None:
@@ -477,81 +841,72 @@ class BrowserSandboxClient(SandboxClient):
         """Query elements via CSS selector and summarize tag/text/href/class/id/name for precise selection."""
         try:
             async def op(page):
-                elements = await page.query_selector_all(selector)
-                results = []
-                for i, element in enumerate(elements[:limit]):
-                    try:
-                        text = await element.inner_text()
-                    except Exception:
-                        text = ""
-                    try:
-                        tag = await element.evaluate("el => el.tagName")
-                    except Exception:
-                        tag = "UNKNOWN"
-                    # Get key attributes for precise selection
-                    attrs = {}
-                    for attr_name in ["id", "class", "name", "type", "href", "role", "aria-label"]:
-                        try:
-                            val = await element.get_attribute(attr_name)
-                            if val:
-                                attrs[attr_name] = val
-                        except Exception:
-                            pass
-                    
-                    # Build info string
-                    info_parts = [f"{i+1}. <{tag}>"]
+                # One round-trip for all matches instead of ~9 CDP calls per element
+                found = await page.eval_on_selector_all(
+                    selector,
+                    """(els, {lim, names}) => ({
+                        total: els.length,
+                        items: els.slice(0, lim).map(el => {
+                            const attrs = {};
+                            for (const name of names) {
+                                const val = el.getAttribute(name);
+                                if (val) attrs[name] = val;
+                            }
+                            // One char past the snippet length is enough to know it was cut
+                            return {tag: el.tagName, text: (el.innerText || "").slice(0, 151), attrs};
+                        }),
+                    })""",
+                    {"lim": limit, "names": list(_ATTR_NAMES)},
+                )
+                total = found["total"]
+                buf = io.StringIO()
+                buf.write(f"Found {total} element(s) matching selector '{selector}':\n")
+                for i, item in enumerate(found["items"]):
+                    text = item["text"]
+                    attrs = item["attrs"]
+                    if i:
+                        buf.write("\n")
+                    buf.write(f"{i+1}. <{item['tag']}>")
                     
                     # Add id if present (most specific)
                     if "id" in attrs:
-                        info_parts.append(f"id=\"{attrs['id']}\"")
+                        buf.write(f" id=\"{attrs['id']}\"")
                     
                     # Add class if present
                     if "class" in attrs:
                         # Truncate long class lists
-                        class_val = attrs["class"]
-                        if len(class_val) > 100:
-                            class_val = class_val[:100] + "..."
-                        info_parts.append(f"class=\"{class_val}\"")
+                        buf.write(f" class=\"{_truncate(attrs['class'], 100)}\"")
                     
                     # Add name if present
                     if "name" in attrs:
-                        info_parts.append(f"name=\"{attrs['name']}\"")
+                        buf.write(f" name=\"{attrs['name']}\"")
                     
                     # Add type if present (for inputs)
                     if "type" in attrs:
-                        info_parts.append(f"type=\"{attrs['type']}\"")
+                        buf.write(f" type=\"{attrs['type']}\"")
                     
                     # Add href if present
                     if "href" in attrs:
-                        href_val = attrs["href"]
-                        if len(href_val) > 80:
-                            href_val = href_val[:80] + "..."
-                        info_parts.append(f"href=\"{href_val}\"")
+                        buf.write(f" href=\"{_truncate(attrs['href'], 80)}\"")
                     
                     # Add aria-label if present (accessibility)
                     if "aria-label" in attrs:
-                        aria_val = attrs["aria-label"]
-                        if len(aria_val) > 60:
-                            aria_val = aria_val[:60] + "..."
-                        info_parts.append(f"aria-label=\"{aria_val}\"")
+                        buf.write(f" aria-label=\"{_truncate(attrs['aria-label'], 60)}\"")
                     
                     # Add role if present
                     if "role" in attrs:
-                        info_parts.append(f"role=\"{attrs['role']}\"")
+                        buf.write(f" role=\"{attrs['role']}\"")
                     
                     # Add text snippet (truncated)
                     if text:
                         snippet = text[:150].replace("\n", " ").strip()
                         if len(text) > 150:
                             snippet += "..."
-                        info_parts.append(f"text=\"{snippet}\"")
-                    
-                    results.append(" ".join(info_parts))
+                        buf.write(f" text=\"{snippet}\"")
                 
-                extra = ""
-                if len(elements) > limit:
-                    extra = f"\n... and {len(elements) - limit} more elements"
-                return f"Found {len(elements)} element(s) matching selector '{selector}':\n" + "\n".join(results) + extra
+                if total > limit:
+                    buf.write(f"\n... and {total - limit} more elements")
+                return buf.getvalue()
 
             return self._with_page(lambda page: op(page), wait_timeout=5000)
         except Exception as e:
@@ -562,27 +917,40 @@ class BrowserSandboxClient(SandboxClient):
         """Extract links from page, optionally filtered by substring."""
         try:
             async def op(page):
-                links = await page.evaluate(
-                    """(pattern) => {
+                # Only the first `limit` links cross CDP; the rest are just counted
+                found = await page.evaluate(
+                    """({pattern, lim}) => {
                         const patt = pattern ? pattern.toLowerCase() : null;
-                        return Array.from(document.querySelectorAll('a[href]')).map((a, idx) => {
+                        const anchors = document.querySelectorAll('a[href]');
+                        const links = [];
+                        if (!patt) {
+                            for (let i = 0; i < anchors.length && links.length < lim; i++) {
+                                const a = anchors[i];
+                                links.push({text: (a.innerText || '').trim().slice(0, 80), href: a.href || ''});
+                            }
+                            return {links, matched: anchors.length};
+                        }
+                        let matched = 0;
+                        for (const a of anchors) {
                             const text = (a.innerText || '').trim();
                             const href = a.href || '';
-                            const title = a.title || '';
-                            const keep = !patt || href.toLowerCase().includes(patt) || text.toLowerCase().includes(patt);
-                            return {text, href, title, keep};
-                        }).filter(l => l.keep);
+                            if (!href.toLowerCase().includes(patt) && !text.toLowerCase().includes(patt)) continue;
+                            matched++;
+                            if (links.length < lim) links.push({text: text.slice(0, 80), href});
+                        }
+                        return {links, matched};
                     }""",
-                    filter_pattern,
+                    {"pattern": filter_pattern, "lim": limit},
                 )
+                matched = found["matched"]
                 summary = []
-                for i, link in enumerate(links[:limit]):
-                    label = link["text"][:80].replace("\n", " ")
+                for i, link in enumerate(found["links"]):
+                    label = link["text"].replace("\n", " ")
                     summary.append(f"{i+1}. {label} -> {link['href']}")
                 extra = ""
-                if len(links) > limit:
-                    extra = f"\n... and {len(links) - limit} more links"
-                header = f"Found {len(links)} link(s)" + (
+                if matched > limit:
+                    extra = f"\n... and {matched - limit} more links"
+                header = f"Found {matched} link(s)" + (
                     f" matching '{filter_pattern}'" if filter_pattern else ""
                 )
                 return header + (":\n" + "\n".join(summary) if summary else "")
@@ -1292,19 +1660,10 @@ class BrowserSandboxClient(SandboxClient):
         if not url:
             raise ValueError("browser_navigate requires 'url' parameter")
         try:
-            from playwright.async_api import async_playwright
-
             async def op():
-                browser_info = self.sdk_client.browser.get_info().data
-                async with async_playwright() as p:
-                    browser = await p.chromium.connect_over_cdp(browser_info.cdp_url)
-                    try:
-                        context = browser.contexts[0] if browser.contexts else await browser.new_context()
-                        page = context.pages[0] if context.pages else await context.new_page()
-                        await page.goto(url, wait_until="domcontentloaded")
-                        return f"Successfully navigated to {url}"
-                    finally:
-                        await browser.close()
+                page = await self._get_page(await self._get_browser())
+                await page.goto(url, wait_until="domcontentloaded")
+                return f"Successfully navigated to {url}"
 
             return self._run_async(op())
         except Exception as e:
@@ -1312,6 +1671,88 @@ class BrowserSandboxClient(SandboxClient):
             logger.exception("Full traceback:")
             return f"Failed to navigate: {str(e)}"
 
+    # Handlers for get_feedback actions that only produce a message; each returns that message
+
+    def _handle_dom_get_text(self, action: Dict[str, Any]) -> str:
+        return self._dom_get_text()
+
+    def _handle_dom_get_html(self, action: Dict[str, Any]) -> str:
+        return self._dom_get_html()
+
+    def _handle_dom_query_selector(self, action: Dict[str, Any]) -> str:
+        selector = action.get("selector")
+        if not selector:
+            return "selector is required for dom_query_selector"
+        return self._dom_query_selector(selector, limit=action.get("limit", 20))
+
+    def _handle_dom_extract_links(self, action: Dict[str, Any]) -> str:
+        return self._dom_extract_links(filter_pattern=action.get("filter_pattern"), limit=action.get("limit", 50))
+
+    def _handle_dom_mark_elements(self, action: Dict[str, Any]) -> str:
+        return self._dom_mark_elements_and_extract(max_elements=action.get("max_elements", 100))
+
+    def _handle_dom_click(self, action: Dict[str, Any]) -> str:
+        bid = action.get("bid")
+        if not bid:
+            return "bid is required for dom_click"
+        return self._dom_click(
+            bid=bid,
+            button=action.get("button", "left"),
+            click_count=action.get("click_count", 1),
+            timeout_ms=action.get("timeout_ms", 2000),
+        )
+
+    def _handle_dom_hover(self, action: Dict[str, Any]) -> str:
+        bid = action.get("bid")
+        if not bid:
+            return "bid is required for dom_hover"
+        return self._dom_hover(bid=bid, timeout_ms=action.get("timeout_ms", 2000))
+
+    def _handle_dom_type(self, action: Dict[str, Any]) -> str:
+        bid = action.get("bid")
+        text = action.get("text")
+        if not bid:
+            return "bid is required for dom_type"
+        if text is None:
+            return "text is required for dom_type"
+        return self._dom_type(
+            bid=bid,
+            text=text,
+            clear_first=action.get("clear_first", True),
+            timeout_ms=action.get("timeout_ms", 2000),
+        )
+
+    def _handle_dom_press(self, action: Dict[str, Any]) -> str:
+        key = action.get("key")
+        if not key:
+            return "key is required for dom_press"
+        return self._dom_press(key=key, bid=action.get("bid"), timeout_ms=action.get("timeout_ms", 2000))
+
+    def _handle_dom_scroll(self, action: Dict[str, Any]) -> str:
+        return self._dom_scroll(
+            bid=action.get("bid"),
+            direction=action.get("direction", "down"),
+            amount=action.get("amount", 500),
+            timeout_ms=action.get("timeout_ms", 2000),
+        )
+
+    def _handle_browser_navigate(self, action: Dict[str, Any]) -> str:
+        return self._navigate_to_url(action.get("url"))
+
+    _FEEDBACK_HANDLERS = {
+        "dom_get_text": _handle_dom_get_text,
+        "dom_get_html": _handle_dom_get_html,
+        "dom_query_selector": _handle_dom_query_selector,
+        "dom_extract_links": _handle_dom_extract_links,
+        "dom_mark_elements": _handle_dom_mark_elements,
+        "dom_click": _handle_dom_click,
+        "dom_hover": _handle_dom_hover,
+        "dom_type": _handle_dom_type,
+        "dom_press": _handle_dom_press,
+        "dom_scroll": _handle_dom_scroll,
+        "browser_navigate": _handle_browser_navigate,
+    }
+
     def get_feedback(self, action: Dict[str, Any]) -> Dict[str, Any]:
         """Get feedback from executing a browser action.
 
@@ -1324,8 +1765,10 @@ class BrowserSandboxClient(SandboxClient):
         # Initialize SDK client if not already done
         self._initialize_sdk_client()
 
+        action_type = action.get("action_type")
+
         # Handle task_complete action
-        if action.get("action_type") == "task_complete" or action.get("command") == "exit" or action.get("action_type") == "exit":
+        if action_type in ("task_complete", "exit") or action.get("command") == "exit":
             logger.debug("Task completed")
             result_text = action.get("result")
             if result_text:
@@ -1347,34 +1790,10 @@ class BrowserSandboxClient(SandboxClient):
             })
             return feedback
 
-        # DOM-based actions (selector/text-based, no coordinates)
-        if action.get("action_type") == "dom_get_text":
-            message = self._dom_get_text()
-            feedback = {"done": False, "message": message}
-            self.execution_history.append({"action": action, "feedback": feedback})
-            return feedback
-
-        if action.get("action_type") == "dom_get_html":
-            message = self._dom_get_html()
-            feedback = {"done": False, "message": message}
-            self.execution_history.append({"action": action, "feedback": feedback})
-            return feedback
-
-        if action.get("action_type") == "dom_query_selector":
-            selector = action.get("selector")
-            limit = action.get("limit", 20)
-            if not selector:
-                feedback = {"done": False, "message": "selector is required for dom_query_selector"}
-            else:
-                message = self._dom_query_selector(selector, limit=limit)
-                feedback = {"done": False, "message": message}
-            self.execution_history.append({"action": action, "feedback": feedback})
-            return feedback
-
-        if action.get("action_type") == "dom_extract_links":
-            pattern = action.get("filter_pattern")
-            limit = action.get("limit", 50)
-            message = self._dom_extract_links(filter_pattern=pattern, limit=limit)
+        # DOM-based actions and navigation: one table lookup instead of a chain of comparisons
+        handler = self._FEEDBACK_HANDLERS.get(action_type)
+        if handler is not None:
+            message = handler(self, action)
             feedback = {"done": False, "message": message}
             self.execution_history.append({"action": action, "feedback": feedback})
             return feedback
@@ -1456,94 +1875,8 @@ class BrowserSandboxClient(SandboxClient):
         #     self.execution_history.append({"action": action, "feedback": feedback})
         #     return feedback
 
-        if action.get("action_type") == "dom_mark_elements":
-            max_elements = action.get("max_elements", 100)
-            message = self._dom_mark_elements_and_extract(max_elements=max_elements)
-            feedback = {"done": False, "message": message}
-            self.execution_history.append({"action": action, "feedback": feedback})
-            return feedback
-
-        if action.get("action_type") == "dom_click":
-            bid = action.get("bid")
-            if not bid:
-                feedback = {"done": False, "message": "bid is required for dom_click"}
-            else:
-                message = self._dom_click(
-                    bid=bid,
-                    button=action.get("button", "left"),
-                    click_count=action.get("click_count", 1),
-                    timeout_ms=action.get("timeout_ms", 2000),
-                )
-                feedback = {"done": False, "message": message}
-            self.execution_history.append({"action": action, "feedback": feedback})
-            return feedback
-
-        if action.get("action_type") == "dom_hover":
-            bid = action.get("bid")
-            if not bid:
-                feedback = {"done": False, "message": "bid is required for dom_hover"}
-            else:
-                message = self._dom_hover(
-                    bid=bid,
-                    timeout_ms=action.get("timeout_ms", 2000),
-                )
-                feedback = {"done": False, "message": message}
-            self.execution_history.append({"action": action, "feedback": feedback})
-            return feedback
-
-        if action.get("action_type") == "dom_type":
-            bid = action.get("bid")
-            text = action.get("text")
-            if not bid:
-                feedback = {"done": False, "message": "bid is required for dom_type"}
-            elif text is None:
-                feedback = {"done": False, "message": "text is required for dom_type"}
-            else:
-                message = self._dom_type(
-                    bid=bid,
-                    text=text,
-                    clear_first=action.get("clear_first", True),
-                    timeout_ms=action.get("timeout_ms", 2000),
-                )
-                feedback = {"done": False, "message": message}
-            self.execution_history.append({"action": action, "feedback": feedback})
-            return feedback
-
-        if action.get("action_type") == "dom_press":
-            key = action.get("key")
-            bid = action.get("bid")
-            if not key:
-                feedback = {"done": False, "message": "key is required for dom_press"}
-            else:
-                message = self._dom_press(
-                    key=key,
-                    bid=bid,
-                    timeout_ms=action.get("timeout_ms", 2000),
-                )
-                feedback = {"done": False, "message": message}
-            self.execution_history.append({"action": action, "feedback": feedback})
-            return feedback
-
-        if action.get("action_type") == "dom_scroll":
-            message = self._dom_scroll(
-                bid=action.get("bid"),
-                direction=action.get("direction", "down"),
-                amount=action.get("amount", 500),
-                timeout_ms=action.get("timeout_ms", 2000),
-            )
-            feedback = {"done": False, "message": message}
-            self.execution_history.append({"action": action, "feedback": feedback})
-            return feedback
-
-        if action.get("action_type") == "browser_navigate":
-            url = action.get("url")
-            message = self._navigate_to_url(url)
-            feedback = {"done": False, "message": message}
-            self.execution_history.append({"action": action, "feedback": feedback})
-            return feedback
-
         # Handle screenshot action
-        if action.get("action_type") == "browser_screenshot":
+        if action_type == "browser_screenshot":
             base64_image, message = self._take_screenshot()
             feedback = {
                 "done": False,
@@ -1556,11 +1889,11 @@ class BrowserSandboxClient(SandboxClient):
                 "action": action,
                 "feedback": feedback
             })
-            logger.debug(f"Feedback (OBSERVATION): \n{colorize(json.dumps({**feedback, 'image_base64': f'<{len(base64_image)} bytes>' if base64_image else None}, indent=2), 'YELLOW')}")
+            _log_feedback(feedback)
             return feedback
 
         # Handle get_viewport_info action
-        if action.get("action_type") == "browser_get_viewport_info":
+        if action_type == "browser_get_viewport_info":
             message = self._get_browser_info()
             feedback = {
                 "done": False,
@@ -1570,7 +1903,7 @@ class BrowserSandboxClient(SandboxClient):
                 "action": action,
                 "feedback": feedback
             })
-            logger.debug(f"Feedback (OBSERVATION): \n{colorize(json.dumps(feedback, indent=2), 'YELLOW')}")
+            _log_feedback(feedback)
             return feedback
 
         try:
@@ -1590,30 +1923,20 @@ class BrowserSandboxClient(SandboxClient):
                 "feedback": feedback
             })
 
-            logger.debug(f"Feedback (OBSERVATION): \n{colorize(json.dumps(feedback, indent=2), 'YELLOW')}")
+            _log_feedback(feedback)
             return feedback
 
         except Exception as e:
-            logger.error(f"Error executing browser action: {e}")
-            logger.exception("Full traceback:")
-            feedback = {
-                "done": False,
-                "message": f"Error: {str(e)}"
-            }
-            self.execution_history.append({
-                "action": action,
-                "feedback": feedback
-            })
-        return feedback
+            return self._record_error(action, e, "browser action")
 
     def get_history(self) -> list[Dict[str, Any]]:
         """Get the recorded execution history of actions and feedbacks."""
-        return self.execution_history
+        return list(self.execution_history)
 
     def clear_history(self) -> None:
         """Clear the execution history."""
         logger.debug(f"Clearing execution history ({len(self.execution_history)} entries)")
-        self.execution_history = []
+        self.execution_history.clear()
 
     def create_docker_environment(self, task: Dict[str, Any], wait_time: int = 60) -> bool:
         """
@@ -1636,34 +1959,68 @@ class BrowserSandboxClient(SandboxClient):
 
 class UnifiedSandboxClient(SandboxClient):
     """Unified client that can handle browser, file, code, and shell operations."""
+
+    _BROWSER_ACTIONS = frozenset({
+        "browser_click", "browser_type", "browser_press", "browser_key_down", "browser_key_up", "browser_hotkey",
+        "browser_scroll", "browser_move_to", "browser_move_rel", "browser_drag_to", "browser_drag_rel",
+        "browser_wait",
+        "dom_get_text", "dom_get_html", "dom_query_selector",
+        "dom_extract_links", "dom_mark_elements", "dom_click", "dom_hover", "dom_type", "dom_press", "dom_scroll",
+        "browser_navigate",
+        "browser_screenshot", "browser_get_viewport_info",
+    })
+    _FILE_ACTIONS = frozenset({
+        "file_read", "file_write", "file_list",
+        "replace_in_file", "search_in_file", "find_files",
+        "str_replace_editor", "image_read",
+    })
+    _CODE_ACTIONS = frozenset({"code_execute"})
+    _SHELL_ACTIONS = frozenset({"shell_execute"})
     
     def __init__(self, sandbox_config: Dict[str, Any] | None = None, **kwargs):
         super().__init__(sandbox_config, **kwargs)
-        self.execution_history: list[Dict[str, Any]] = []
+        # Route each action type to its handler with a single lookup
+        self._dispatch: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+            **dict.fromkeys(self._BROWSER_ACTIONS, self._handle_browser_action),
+            **dict.fromkeys(self._FILE_ACTIONS, self._handle_file_action),
+            **dict.fromkeys(self._CODE_ACTIONS, self._handle_code_action),
+            **dict.fromkeys(self._SHELL_ACTIONS, self._handle_shell_action),
+        }
+        self.execution_history: ExecutionHistory = ExecutionHistory(self.history_limit, self.history_spill_path)
         self.sdk_client: Optional[Sandbox] = None
         
         # Session IDs for stateful operations
         self.shell_session_id: Optional[str] = None
         self.jupyter_session_id: Optional[str] = None
+        # Browser action handler, kept so its CDP connection is reused across actions
+        self._browser_client: Optional[BrowserSandboxClient] = None
+    
+    def close(self) -> None:
+        """Close pooled HTTP connections and the browser handler's CDP connection."""
+        super().close()
+        if self._browser_client is not None:
+            self._browser_client._close_browser()
+            self._browser_client._browser_info = None
     
     def _initialize_sdk_client(self) -> None:
         """Initialize the AIO Sandbox SDK client and create sessions."""
         if self.sdk_client is None:
-            self.sdk_client = Sandbox(base_url=self.base_url)
+            self.sdk_client = _create_sdk_client(self.base_url)
             logger.debug(f"Initialized Sandbox SDK client with base_url: {self.base_url}")
             
-            # Create shell session
+            # Create the shell and Jupyter sessions concurrently; they are independent round-trips
+            with ThreadPoolExecutor(max_workers=2, thread_name_prefix="session-init") as pool:
+                shell_future = pool.submit(self.sdk_client.shell.create_session, exec_dir="/home/gem")
+                jupyter_future = pool.submit(self.sdk_client.jupyter.create_session, kernel_name="python3")
+
             try:
-                session = self.sdk_client.shell.create_session(exec_dir="/home/gem")
-                self.shell_session_id = session.data.session_id
+                self.shell_session_id = shell_future.result().data.session_id
                 logger.debug(f"Created shell session: {self.shell_session_id}")
             except Exception as e:
                 logger.warning(f"Failed to create shell session: {e}")
             
-            # Create Jupyter session
             try:
-                session = self.sdk_client.jupyter.create_session(kernel_name="python3")
-                self.jupyter_session_id = session.data.session_id
+                self.jupyter_session_id = jupyter_future.result().data.session_id
                 logger.debug(f"Created Jupyter session: {self.jupyter_session_id}")
             except Exception as e:
                 logger.warning(f"Failed to create Jupyter session: {e}")
@@ -1678,7 +2035,7 @@ class UnifiedSandboxClient(SandboxClient):
         action_type = action.get("action_type")
         
         # Handle task_complete action
-        if action_type == "task_complete" or action_type == "exit":
+        if action_type in ("task_complete", "exit"):
             logger.debug("Task completed")
             result_text = action.get("result")
             if result_text:
@@ -1699,29 +2056,12 @@ class UnifiedSandboxClient(SandboxClient):
         
         # Route to appropriate handler based on action type
         try:
-            # Browser actions
-            if action_type in ["browser_click", "browser_type", "browser_press", "browser_key_down", "browser_key_up", "browser_hotkey",
-                              "browser_scroll", "browser_move_to", "browser_move_rel", "browser_drag_to", "browser_drag_rel",
-                              "browser_wait",
-                              "dom_get_text", "dom_get_html", "dom_query_selector",
-                              "dom_extract_links", "dom_mark_elements", "dom_click", "dom_hover", "dom_type", "dom_press", "dom_scroll",
-                              "browser_navigate",
-                              "browser_screenshot", "browser_get_viewport_info",
-                              ]:
-                return self._handle_browser_action(action)
-            
-            # File actions
-            elif action_type in ["file_read", "file_write", "file_list",
-                               "replace_in_file", "search_in_file", "find_files", 
-                               "str_replace_editor", "image_read"]:
-                return self._handle_file_action(action)
+            handler = self._dispatch.get(action_type)
+            if handler is not None:
+                return handler(action)
             
-            # Code actions
-            elif action_type in ["code_execute"]:
-                return self._handle_code_action(action)
-            
-            # Shell actions
-            elif action_type in ["shell_execute"] or action.get("command"):
+            # Shell commands may arrive without an action_type
+            elif action.get("command"):
                 return self._handle_shell_action(action)
             
             else:
@@ -1731,10 +2071,7 @@ class UnifiedSandboxClient(SandboxClient):
                 return feedback
         
         except Exception as e:
-            logger.error(f"Error executing action: {e}")
-            feedback = {"done": False, "message": f"Error: {str(e)}"}
-            self.execution_history.append({"action": action, "feedback": feedback})
-            return feedback
+            return self._record_error(action, e, "action")
     
     def take_screenshot(self) -> tuple[str, str]:
         """Take a screenshot and return base64 encoded string and status message.
@@ -1744,10 +2081,7 @@ class UnifiedSandboxClient(SandboxClient):
         """
         self._initialize_sdk_client()
         try:
-            import base64
-            screenshot_data = b""
-            for chunk in self.sdk_client.browser.screenshot():
-                screenshot_data += chunk
+            screenshot_data = b"".join(self.sdk_client.browser.screenshot())
             
             # Encode to base64
             base64_image = base64.b64encode(screenshot_data).decode('utf-8')
@@ -1760,14 +2094,13 @@ class UnifiedSandboxClient(SandboxClient):
     def _handle_browser_action(self, action: Dict[str, Any]) -> Dict[str, Any]:
         """Handle browser-specific actions."""
         # Reuse BrowserSandboxClient logic
-        browser_client = BrowserSandboxClient.__new__(BrowserSandboxClient)
+        browser_client = self._browser_client
+        if browser_client is None:
+            browser_client = self._browser_client = BrowserSandboxClient.__new__(BrowserSandboxClient)
+            # Shared by reference (clear_history clears in place), so no merge is needed
+            browser_client.execution_history = self.execution_history
         browser_client.sdk_client = self.sdk_client
-        browser_client.execution_history = []
-        feedback = browser_client.get_feedback(action)
-        
-        # Merge history
-        self.execution_history.extend(browser_client.execution_history)
-        return feedback
+        return browser_client.get_feedback(action)
     
     def _handle_file_action(self, action: Dict[str, Any]) -> Dict[str, Any]:
         """Handle file-specific actions."""
@@ -1778,11 +2111,15 @@ class UnifiedSandboxClient(SandboxClient):
                 file_path = action.get("path") or action.get("file")
                 if not file_path:
                     raise ValueError("file_read requires 'path' or 'file' parameter")
-                result = self.sdk_client.file.read_file(file=file_path)
+                # Every line holds at least one char, so FILE_READ_MAX_CHARS + 1 lines are always
+                # enough to fill the preview; the rest of a long file is never transferred
+                result = self.sdk_client.file.read_file(file=file_path, end_line=FILE_READ_MAX_CHARS + 1)
                 content = result.data.content
                 # Return full content for small files, summary for large files
-                if len(content) > 5000:
-                    message = f"File content (first 5000 chars):\n{content[:5000]}\n... (truncated, total {len(content)} chars)"
+                if len(content) > FILE_READ_MAX_CHARS:
+                    # With that many lines the server may have stopped early, so the size is a lower bound
+                    total = f"{len(content)}+" if content.count("\n") >= FILE_READ_MAX_CHARS else str(len(content))
+                    message = f"File content (first {FILE_READ_MAX_CHARS} chars):\n{content[:FILE_READ_MAX_CHARS]}\n... (truncated, total {total} chars)"
                 else:
                     message = f"File content:\n{content}"
                 
@@ -1801,8 +2138,10 @@ class UnifiedSandboxClient(SandboxClient):
                 if not path:
                     raise ValueError("file_list requires 'path' parameter")
                 result = self.sdk_client.file.list_path(path=path)
-                files = [f.name for f in result.data.files]
-                message = f"Files in {path} ({len(files)} items):\n" + "\n".join(files[:50]) + (f"\n... and {len(files) - 50} more" if len(files) > 50 else "")
+                entries = result.data.files or []
+                total = len(entries)
+                names = [f.name for f in islice(entries, FILE_LIST_MAX_ENTRIES)]
+                message = f"Files in {path} ({total} items):\n" + "\n".join(names) + (f"\n... and {total - FILE_LIST_MAX_ENTRIES} more" if total > FILE_LIST_MAX_ENTRIES else "")
             
             elif action_type == "replace_in_file":
                 file_path = action.get("file")
@@ -1850,7 +2189,6 @@ class UnifiedSandboxClient(SandboxClient):
                 message = f"Found {len(files)} files matching '{glob_pattern}'"
 
             elif action_type == "str_replace_editor":
-                from agent_sandbox.file.types import Command
                 command = action.get("command")
                 path = action.get("path")
                 if not command:
@@ -1858,42 +2196,26 @@ class UnifiedSandboxClient(SandboxClient):
                 if not path:
                     raise ValueError("str_replace_editor requires 'path' parameter")
                 
-                command_map = {
-                    "view": Command.VIEW,
-                    "create": Command.CREATE,
-                    "str_replace": Command.STR_REPLACE,
-                    "insert": Command.INSERT,
-                    "undo_edit": Command.UNDO_EDIT
-                }
-                if command not in command_map:
-                    raise ValueError(f"str_replace_editor: invalid command '{command}'. Valid commands: {list(command_map.keys())}")
-                cmd_enum = command_map[command]
+                if command not in _EDITOR_COMMANDS:
+                    raise ValueError(f"str_replace_editor: invalid command '{command}'. Valid commands: {list(_EDITOR_COMMANDS)}")
                 
-                kwargs = {"command": cmd_enum, "path": path}
-                if action.get("file_text"):
-                    kwargs["file_text"] = action.get("file_text")
-                if action.get("old_str"):
-                    kwargs["old_str"] = action.get("old_str")
-                if action.get("new_str"):
-                    kwargs["new_str"] = action.get("new_str")
-                if action.get("insert_line"):
-                    kwargs["insert_line"] = action.get("insert_line")
-                if action.get("view_range"):
-                    kwargs["view_range"] = action.get("view_range")
+                kwargs = {"command": command, "path": path}
+                # Optional arguments are only forwarded when set (falsy values are dropped)
+                for key in _EDITOR_OPTIONAL_KEYS:
+                    value = action.get(key)
+                    if value:
+                        kwargs[key] = value
                 
                 result = self.sdk_client.file.str_replace_editor(**kwargs)
                 message = f"Editor command '{command}' executed on {path}"
             
             elif action_type == "image_read":
-                import base64
                 file_path = action.get("path") or action.get("file")
                 if not file_path:
                     raise ValueError("image_read requires 'path' or 'file' parameter")
                 
                 # Download the image file as binary data
-                image_data = b""
-                for chunk in self.sdk_client.file.download_file(path=file_path):
-                    image_data += chunk
+                image_data = b"".join(self.sdk_client.file.download_file(path=file_path))
                 
                 if not image_data:
                     raise ValueError(f"Failed to read image file: {file_path} or file is empty")
@@ -1906,7 +2228,7 @@ class UnifiedSandboxClient(SandboxClient):
                 feedback = {"done": False, "message": message}
                 feedback["image_base64"] = base64_image
                 self.execution_history.append({"action": action, "feedback": feedback})
-                logger.debug(f"Feedback (OBSERVATION): \n{colorize(json.dumps({**feedback, 'image_base64': f'<{len(base64_image)} chars>'}, indent=2), 'YELLOW')}")
+                _log_feedback(feedback)
                 return feedback
             
             else:
@@ -1914,15 +2236,11 @@ class UnifiedSandboxClient(SandboxClient):
             
             feedback = {"done": False, "message": message}
             self.execution_history.append({"action": action, "feedback": feedback})
-            logger.debug(f"Feedback (OBSERVATION): \n{colorize(json.dumps(feedback, indent=2), 'YELLOW')}")
+            _log_feedback(feedback)
             return feedback
             
         except Exception as e:
-            logger.error(f"Error executing file action: {e}")
-            logger.exception("Full traceback:")
-            feedback = {"done": False, "message": f"Error: {str(e)}"}
-            self.execution_history.append({"action": action, "feedback": feedback})
-            return feedback
+            return self._record_error(action, e, "file action")
     
     def _handle_code_action(self, action: Dict[str, Any]) -> Dict[str, Any]:
         """Handle code execution actions."""
@@ -1943,9 +2261,9 @@ class UnifiedSandboxClient(SandboxClient):
             data = result.data
             parts = []
             if data.stdout:
-                parts.append(data.stdout.rstrip())
+                parts.append(_cap_output(data.stdout.rstrip()))
             if data.stderr:
-                parts.append(f"[stderr]\n{data.stderr.rstrip()}")
+                parts.append(f"[stderr]\n{_cap_output(data.stderr.rstrip())}")
             if data.outputs:
                 try:
                     parts.append(json.dumps(data.outputs, indent=2))
@@ -1956,16 +2274,22 @@ class UnifiedSandboxClient(SandboxClient):
 
             feedback = {"done": False, "message": message}
             self.execution_history.append({"action": action, "feedback": feedback})
-            logger.debug(f"Feedback (OBSERVATION): \n{colorize(json.dumps(feedback, indent=2), 'YELLOW')}")
+            _log_feedback(feedback)
             return feedback
             
         except Exception as e:
-            logger.error(f"Error executing code action: {e}")
-            logger.exception("Full traceback:")
-            feedback = {"done": False, "message": f"Error: {str(e)}"}
-            self.execution_history.append({"action": action, "feedback": feedback})
-            return feedback
+            return self._record_error(action, e, "code action")
     
+    def _exec_shell_command(self, command: str):
+        """Run a command synchronously in the current shell session."""
+        return self.sdk_client.shell.exec_command(
+            command=command,
+            id=self.shell_session_id,
+            exec_dir="/home/gem",
+            async_mode=False,
+            timeout=0
+        )
+
     def _handle_shell_action(self, action: Dict[str, Any]) -> Dict[str, Any]:
         """Handle shell command execution."""
         try:
@@ -1985,66 +2309,46 @@ class UnifiedSandboxClient(SandboxClient):
             
             # Execute command with session ID (or let SDK auto-create if session_id is None)
             try:
-                result = self.sdk_client.shell.exec_command(
-                    command=command,
-                    id=self.shell_session_id,
-                    exec_dir="/home/gem",
-                    async_mode=False,
-                    timeout=0
-                )
+                result = self._exec_shell_command(command)
                 
                 # Update session_id in case SDK created a new one
                 if hasattr(result, 'data') and hasattr(result.data, 'session_id'):
                     self.shell_session_id = result.data.session_id
-                
-                output = result.data.output
-                message = output if output else "Command executed successfully (no output)"
-            except Exception as session_error:
-                # If session not found, try to create a new one and retry
-                error_str = str(session_error)
-                if "Session not found" in error_str or "404" in error_str:
-                    logger.warning(f"Session {self.shell_session_id} not found, creating new session")
-                    try:
-                        session = self.sdk_client.shell.create_session(exec_dir="/home/gem")
-                        self.shell_session_id = session.data.session_id
-                        logger.debug(f"Created new shell session after error: {self.shell_session_id}")
-                        
-                        # Retry command with new session
-                        result = self.sdk_client.shell.exec_command(
-                            command=command,
-                            id=self.shell_session_id,
-                            exec_dir="/home/gem",
-                            async_mode=False,
-                            timeout=0
-                        )
-                        output = result.data.output
-                        message = output if output else "Command executed successfully (no output)"
-                    except Exception as retry_error:
-                        logger.error(f"Failed to create new session and retry: {retry_error}")
-                        raise retry_error
-                else:
-                    raise session_error
+            except ApiError as session_error:
+                # If session not found, try to create a new one and retry; other failures propagate
+                if session_error.status_code != 404 and "Session not found" not in str(session_error.body):
+                    raise
+                logger.warning(f"Session {self.shell_session_id} not found, creating new session")
+                try:
+                    session = self.sdk_client.shell.create_session(exec_dir="/home/gem")
+                    self.shell_session_id = session.data.session_id
+                    logger.debug(f"Created new shell session after error: {self.shell_session_id}")
+                    
+                    # Retry command with new session
+                    result = self._exec_shell_command(command)
+                except Exception as retry_error:
+                    logger.error(f"Failed to create new session and retry: {retry_error}")
+                    raise
+            
+            output = result.data.output
+            message = output if output else "Command executed successfully (no output)"
             
             feedback = {"done": False, "message": message}
             self.execution_history.append({"action": action, "feedback": feedback})
-            logger.debug(f"Feedback (OBSERVATION): \n{colorize(json.dumps(feedback, indent=2), 'YELLOW')}")
+            _log_feedback(feedback)
             return feedback
             
         except Exception as e:
-            logger.error(f"Error executing shell action: {e}")
-            logger.exception("Full traceback:")
-            feedback = {"done": False, "message": f"Error: {str(e)}"}
-            self.execution_history.append({"action": action, "feedback": feedback})
-            return feedback
+            return self._record_error(action, e, "shell action")
     
     def get_history(self) -> list[Dict[str, Any]]:
         """Get the recorded execution history."""
-        return self.execution_history
+        return list(self.execution_history)
     
     def clear_history(self) -> None:
         """Clear the execution history."""
         logger.debug(f"Clearing execution history ({len(self.execution_history)} entries)")
-        self.execution_history = []
+        self.execution_history.clear()
     
     def create_docker_environment(self, task: Dict[str, Any], wait_time: int = 60) -> bool:
         """Create and start an agent server container."""
@@ -2,16 +2,28 @@
 Tool definitions for browser actions.
 """
 
+import functools
 from typing import Dict, List, Any
 
 
+class ToolSet(list):
+    """List of tool definitions that can be weak-referenced and hashed by identity.
+
+    Lets callers cache values derived from a tool list (e.g. its text rendering)
+    in a `weakref.WeakKeyDictionary` without keeping the list alive.
+    """
+
+    __hash__ = object.__hash__
+
+
+@functools.lru_cache(maxsize=1)
 def get_browser_tools() -> List[Dict[str, Any]]:
     """Get OpenAI tool definitions for browser actions.
     
     Returns:
         List of tool definitions in OpenAI format
     """
-    tools = [
+    tools = ToolSet([
         {
             "type": "function",
             "function": {
@@ -527,18 +539,19 @@ def get_browser_tools() -> List[Dict[str, Any]]:
                 }
             }
         }
-    ]
+    ])
     
     return tools
 
 
+@functools.lru_cache(maxsize=1)
 def get_file_tools() -> List[Dict[str, Any]]:
     """Get OpenAI tool definitions for file operations.
     
     Returns:
         List of tool definitions in OpenAI format
     """
-    tools = [
+    tools = ToolSet([
         {
             "type": "function",
             "function": {
@@ -737,18 +750,19 @@ def get_file_tools() -> List[Dict[str, Any]]:
                 }
             }
         }
-    ]
+    ])
     
     return tools
 
 
+@functools.lru_cache(maxsize=1)
 def get_code_tools() -> List[Dict[str, Any]]:
     """Get OpenAI tool definitions for code execution.
     
     Returns:
         List of tool definitions in OpenAI format
     """
-    tools = [
+    tools = ToolSet([
         {
             "type": "function",
             "function": {
@@ -791,18 +805,19 @@ def get_code_tools() -> List[Dict[str, Any]]:
                 }
             }
         }
-    ]
+    ])
     
     return tools
 
 
+@functools.lru_cache(maxsize=1)
 def get_shell_tools() -> List[Dict[str, Any]]:
     """Get OpenAI tool definitions for shell operations.
     
     Returns:
         List of tool definitions in OpenAI format
     """
-    tools = [
+    tools = ToolSet([
         {
             "type": "function",
             "function": {
@@ -836,40 +851,102 @@ def get_shell_tools() -> List[Dict[str, Any]]:
                 }
             }
         }
-    ]
+    ])
     
     return tools
 
 
+@functools.lru_cache(maxsize=1)
 def get_unified_tools() -> List[Dict[str, Any]]:
     """Get unified OpenAI tool definitions combining all sandbox capabilities.
     
     Returns:
-        List of tool definitions in OpenAI format combining browser, file, code, and shell tools
+        List of tool definitions in OpenAI format combining browser, file, code, and shell tools.
+        Tool getters are cached, so the returned lists are shared and must not be mutated.
     """
-    # Get all tool sets
-    browser_tools = get_browser_tools()
-    file_tools = get_file_tools()
-    code_tools = get_code_tools()
-    shell_tools = get_shell_tools()
-    
-    # Combine all tools, removing duplicate task_complete
-    all_tools = []
-    task_complete_added = False
+    # Combine all tools; the first definition of a name wins (drops repeated task_complete)
+    all_tools = ToolSet()
+    seen = set()
     
-    for tool_set in [browser_tools, file_tools, code_tools, shell_tools]:
+    for tool_set in (get_browser_tools(), get_file_tools(), get_code_tools(), get_shell_tools()):
         for tool in tool_set:
             tool_name = tool["function"]["name"]
-            if tool_name == "task_complete":
-                if not task_complete_added:
-                    all_tools.append(tool)
-                    task_complete_added = True
-            else:
-                all_tools.append(tool)
+            if tool_name in seen:
+                continue
+            seen.add(tool_name)
+            all_tools.append(tool)
     
     return all_tools
 
 
+def _build_param_option_text(tools: List[Dict[str, Any]]) -> Dict[tuple[str, str], tuple[str | None, str | None]]:
+    """Pre-stringify enum options and defaults for every tool parameter.
+    
+    Args:
+        tools: List of tool definitions in OpenAI format
+        
+    Returns:
+        Mapping of (tool_name, param_name) to (enum_text, default_text); either is None if absent
+    """
+    option_text = {}
+    for tool in tools:
+        func = tool["function"]
+        for param_name, param_info in func["parameters"].get("properties", {}).items():
+            param_enum = param_info.get("enum")
+            param_default = param_info.get("default")
+            option_text[(func["name"], param_name)] = (
+                ", ".join(map(str, param_enum)) if param_enum else None,
+                str(param_default) if param_default is not None else None,
+            )
+    return option_text
+
+
+# Built once from the static schemas so prompt rendering does no per-parameter str() work.
+# Kept outside the schemas themselves because those are sent to the API verbatim.
+PARAM_OPTION_TEXT = _build_param_option_text(get_unified_tools())
+
+
+# Valid parameters for each tool (to catch invalid parameters early)
+TOOL_VALID_PARAMS: Dict[str, frozenset] = {
+    "browser_click": frozenset({"x", "y", "button", "num_clicks"}),
+    "browser_type": frozenset({"text", "use_clipboard"}),
+    "browser_press": frozenset({"key"}),
+    "browser_scroll": frozenset({"dx", "dy"}),
+    "browser_move_to": frozenset({"x", "y"}),
+    "browser_move_rel": frozenset({"x_offset", "y_offset"}),
+    "browser_drag_to": frozenset({"x", "y"}),
+    "browser_drag_rel": frozenset({"x_offset", "y_offset"}),
+    "browser_hotkey": frozenset({"keys"}),
+    "browser_key_down": frozenset({"key"}),
+    "browser_key_up": frozenset({"key"}),
+    "browser_wait": frozenset({"duration"}),
+    "browser_screenshot": frozenset(),
+    "browser_get_viewport_info": frozenset(),
+    "browser_navigate": frozenset({"url"}),
+    "dom_get_text": frozenset(),
+    "dom_get_html": frozenset(),
+    "dom_query_selector": frozenset({"selector", "limit"}),
+    "dom_extract_links": frozenset({"filter_pattern", "limit"}),
+    "dom_mark_elements": frozenset({"max_elements"}),
+    "dom_click": frozenset({"bid", "button", "click_count", "timeout_ms"}),
+    "dom_hover": frozenset({"bid", "timeout_ms"}),
+    "dom_type": frozenset({"bid", "text", "clear_first", "timeout_ms"}),
+    "dom_press": frozenset({"key", "bid", "timeout_ms"}),
+    "dom_scroll": frozenset({"bid", "direction", "amount", "timeout_ms"}),
+    "file_read": frozenset({"path"}),
+    "file_write": frozenset({"path", "content"}),
+    "file_list": frozenset({"path"}),
+    "replace_in_file": frozenset({"file", "old_text", "new_text"}),
+    "search_in_file": frozenset({"file", "pattern"}),
+    "find_files": frozenset({"path", "glob"}),
+    "image_read": frozenset({"path"}),
+    "str_replace_editor": frozenset({"command", "path", "file_text", "old_str", "new_str", "insert_line", "view_range"}),
+    "code_execute": frozenset({"code", "language", "timeout"}),
+    "shell_execute": frozenset({"command"}),
+    "task_complete": frozenset({"result"}),
+}
+
+
 def map_tool_call_to_action(tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
     """Map a tool call to a sandbox action.
     
@@ -883,64 +960,20 @@ def map_tool_call_to_action(tool_name: str, arguments: Dict[str, Any]) -> Dict[s
     Raises:
         ValueError: If invalid parameters are provided for a tool
     """
-    # Define valid parameters for each tool (to catch invalid parameters early)
-    tool_valid_params = {
-        "browser_click": {"x", "y", "button", "num_clicks"},
-        "browser_type": {"text", "use_clipboard"},
-        "browser_press": {"key"},
-        "browser_scroll": {"dx", "dy"},
-        "browser_move_to": {"x", "y"},
-        "browser_move_rel": {"x_offset", "y_offset"},
-        "browser_drag_to": {"x", "y"},
-        "browser_drag_rel": {"x_offset", "y_offset"},
-        "browser_hotkey": {"keys"},
-        "browser_key_down": {"key"},
-        "browser_key_up": {"key"},
-        "browser_wait": {"duration"},
-        "browser_screenshot": set(),
-        "browser_get_viewport_info": set(),
-        "browser_navigate": {"url"},
-        "dom_get_text": set(),
-        "dom_get_html": set(),
-        "dom_query_selector": {"selector", "limit"},
-        "dom_extract_links": {"filter_pattern", "limit"},
-        "dom_mark_elements": {"max_elements"},
-        "dom_click": {"bid", "button", "click_count", "timeout_ms"},
-        "dom_hover": {"bid", "timeout_ms"},
-        "dom_type": {"bid", "text", "clear_first", "timeout_ms"},
-        "dom_press": {"key", "bid", "timeout_ms"},
-        "dom_scroll": {"bid", "direction", "amount", "timeout_ms"},
-        "file_read": {"path"},
-        "file_write": {"path", "content"},
-        "file_list": {"path"},
-        "replace_in_file": {"file", "old_text", "new_text"},
-        "search_in_file": {"file", "pattern"},
-        "find_files": {"path", "glob"},
-        "image_read": {"path"},
-        "str_replace_editor": {"command", "path", "file_text", "old_str", "new_str", "insert_line", "view_range"},
-        "code_execute": {"code", "language", "timeout"},
-        "shell_execute": {"command"},
-        "task_complete": {"result"},
-    }
-    
-    # Validate parameters if tool is in the validation map
-    if tool_name in tool_valid_params:
-        valid_params = tool_valid_params[tool_name]
-        invalid_params = set(arguments.keys()) - valid_params
-        if invalid_params:
-            raise ValueError(
-                f"Tool '{tool_name}' does not support parameters: {invalid_params}. "
-                f"Valid parameters are: {valid_params}. "
-                f"Received: {list(arguments.keys())}"
-            )
-        # Filter to only valid parameters (in case of typos or extra params)
-        arguments = {k: v for k, v in arguments.items() if k in valid_params}
-    
     # Validate that tool_name is known
-    valid_tools = set(tool_valid_params.keys())
-    if tool_name not in valid_tools:
+    valid_params = TOOL_VALID_PARAMS.get(tool_name)
+    if valid_params is None:
         raise ValueError(f"Unknown tool: {tool_name}")
     
+    # Reject parameters the tool does not accept (one set difference over the keys view)
+    invalid_params = arguments.keys() - valid_params
+    if invalid_params:
+        raise ValueError(
+            f"Tool '{tool_name}' does not support parameters: {invalid_params}. "
+            f"Valid parameters are: {set(valid_params)}. "
+            f"Received: {list(arguments.keys())}"
+        )
+    
     # Build action with tool name as action_type (no mapping needed)
     action = {"action_type": tool_name}
     action.update(arguments)
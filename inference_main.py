@@ -3,6 +3,7 @@ Main inference script for running model inference in the agent environment.
 """
 
 import argparse
+import functools
 import json
 import os
 from pathlib import Path
@@ -10,13 +11,35 @@ from typing import Any, Dict, List
 
 import yaml
 
+# Prefer the libyaml-backed loader when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from agents import BaseAgent, CocoaAgent, OpenAIDeepResearchAgent, GeminiDeepResearchAgent
 from executor.utils import setup_logging, load_config, get_logger
 from decrypt import decrypt_file_to_memory, read_canary
 
 
-def parse_arguments() -> dict:
-    """Parse command line arguments."""
+def dump_result(result: Dict[str, Any]) -> bytes:
+    """Serialize a task result as indented JSON, using orjson when installed."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(result, option=orjson.OPT_INDENT_2)
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(result, indent=2).encode("utf-8")
+
+
+@functools.lru_cache(maxsize=1)
+def _build_parser() -> argparse.ArgumentParser:
+    """Build the command line parser once per process."""
     parser = argparse.ArgumentParser(description="Run model inference on tasks")
     parser.add_argument("--config", type=str, default="config.json",
                        help="Path to configuration file")
@@ -26,8 +49,12 @@ def parse_arguments() -> dict:
                        help="Output directory for results (one JSON file per task)")
     parser.add_argument("--model", type=str,
                        help="Override model name from config")
+    return parser
+
 
-    return parser.parse_args()
+def parse_arguments() -> argparse.Namespace:
+    """Parse command line arguments."""
+    return _build_parser().parse_args()
 
 
 def load_tasks(tasks_dir: str, use_encrypted: bool = False) -> List[Dict[str, Any]]:
@@ -51,20 +78,25 @@ def load_tasks(tasks_dir: str, use_encrypted: bool = False) -> List[Dict[str, An
     if not tasks_path.is_dir():
         raise ValueError(f"Tasks directory not found: {tasks_dir}")
 
+    # One scandir pass; DirEntry.is_dir() answers from the cached d_type where possible
+    with os.scandir(tasks_path) as it:
+        task_dirs = sorted(Path(entry.path) for entry in it if entry.is_dir())
+
     # Iterate through task subdirectories
-    for task_dir in sorted(tasks_path.iterdir()):
-        if not task_dir.is_dir():
-            continue
+    for task_dir in task_dirs:
+        # List each task directory once instead of stat-ing every expected file
+        with os.scandir(task_dir) as it:
+            names = {entry.name for entry in it}
 
         if use_encrypted:
             # Load from encrypted file (decrypt to memory only)
             task_file_enc = task_dir / "task.yaml.enc"
-            if not task_file_enc.exists():
+            if "task.yaml.enc" not in names:
                 logger.warning(f"No task.yaml.enc found in {task_dir}, skipping")
                 continue
             
             # Read canary for decryption
-            canary = read_canary(task_dir)
+            canary = read_canary(task_dir) if "canary.txt" in names else None
             if canary is None:
                 logger.warning(f"No canary.txt found in {task_dir}, skipping")
                 continue
@@ -72,19 +104,20 @@ def load_tasks(tasks_dir: str, use_encrypted: bool = False) -> List[Dict[str, An
             try:
                 # Decrypt to memory
                 task_yaml_content = decrypt_file_to_memory(task_file_enc, canary)
-                task_data = yaml.safe_load(task_yaml_content)
+                task_data = yaml.load(task_yaml_content, Loader=YamlLoader)
             except Exception as e:
                 logger.error(f"Failed to decrypt task.yaml.enc in {task_dir}: {e}")
                 continue
         else:
             # Load from plaintext file
             task_file = task_dir / "task.yaml"
-            if not task_file.exists():
+            if "task.yaml" not in names:
                 logger.warning(f"No task.yaml found in {task_dir}, skipping")
                 continue
 
-            with open(task_file, 'r') as f:
-                task_data = yaml.safe_load(f)
+            # Binary mode: the loader detects the encoding itself
+            with open(task_file, 'rb') as f:
+                task_data = yaml.load(f, Loader=YamlLoader)
 
         if task_data is None:
             logger.warning(f"Empty task data in {task_dir}, skipping")
@@ -97,11 +130,11 @@ def load_tasks(tasks_dir: str, use_encrypted: bool = False) -> List[Dict[str, An
         # Check for test file (encrypted or plaintext based on mode)
         if use_encrypted:
             test_file_enc = task_dir / "test.py.enc"
-            task_data["test_file_path"] = str(test_file_enc) if test_file_enc.exists() else None
+            task_data["test_file_path"] = str(test_file_enc) if "test.py.enc" in names else None
             task_data["use_encrypted"] = True
         else:
             test_file = task_dir / "test.py"
-            task_data["test_file_path"] = str(test_file) if test_file.exists() else None
+            task_data["test_file_path"] = str(test_file) if "test.py" in names else None
             task_data["use_encrypted"] = False
 
         tasks.append(task_data)
@@ -128,7 +161,8 @@ def main():
         config["controller"]["args"]["model"] = args.model
         logger.info(f"Model overridden to: {args.model}")
 
-    os.makedirs(args.output_dir, exist_ok=True)
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
 
     # Check if we should use encrypted tasks
     use_encrypted = config.get("use_encrypted_tasks", False)
@@ -163,9 +197,9 @@ def main():
                 result["eval"] = test_result
 
             # Save result to task-specific JSON file
-            output_file = Path(args.output_dir) / f"{task_name}.json"
-            with open(output_file, 'w') as f:
-                json.dump(result, f, indent=2)
+            output_file = output_dir / f"{task_name}.json"
+            with open(output_file, 'wb') as f:
+                f.write(dump_result(result))
             logger.debug(f"Task {task_name} result saved to {output_file}")
         finally:
             agent.cleanup_environment()
@@ -5,11 +5,70 @@ Simple HTTP server for serving the agent visualization interface.
 
 import json
 import argparse
+import functools
+import gzip
 from pathlib import Path
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import os
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps_json(obj) -> bytes:
+    """Serialize an API response body as compact JSON, using orjson when installed."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(obj, separators=(",", ":")).encode('utf-8')
+
+
+def encode_body(obj) -> tuple:
+    """Serialize an API response once as (raw, gzipped) so cached bodies are never recompressed."""
+    raw = dumps_json(obj)
+    return raw, gzip.compress(raw, compresslevel=6)
+
+
+@functools.lru_cache(maxsize=32)
+def load_viz_payload(path_str: str, mtime_ns: int, size: int) -> tuple:
+    """Return the /api/data body for a result file.
+    
+    mtime_ns and size only key the cache, so a rewritten result file is read again.
+    """
+    with open(path_str, 'r') as f:
+        data = json.load(f)
+    
+    # Extract visualization_data from result
+    visualization_data = data.get("visualization_data", {})
+    
+    # Add eval data if available
+    if "eval" in data:
+        visualization_data["eval"] = data["eval"]
+    
+    return encode_body(visualization_data)
+
+
+@functools.lru_cache(maxsize=8)
+def load_file_list(dir_str: str, mtime_ns: int) -> tuple:
+    """Return the /api/list body for a data directory.
+    
+    The directory's mtime changes whenever an entry is added, removed or renamed,
+    so keying on it lets repeated polling skip the rescan.
+    """
+    with os.scandir(dir_str) as it:
+        # Same matches as glob("*.json"): hidden files are skipped
+        files = [
+            entry.name for entry in it
+            if entry.name.endswith(".json") and not entry.name.startswith(".") and entry.is_file()
+        ]
+    return encode_body({"files": files})
+
+
 class VisualizationHandler(SimpleHTTPRequestHandler):
     """Custom handler to serve visualization data."""
     
@@ -17,64 +76,76 @@ class VisualizationHandler(SimpleHTTPRequestHandler):
         self.data_dir = Path(data_dir) if data_dir else None
         super().__init__(*args, **kwargs)
     
+    def send_json(self, payload: tuple):
+        """Send a cached (raw, gzipped) JSON body, gzip-encoded when the client accepts it."""
+        raw, gzipped = payload
+        use_gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+        body = gzipped if use_gzip else raw
+        
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Vary", "Accept-Encoding")
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _handle_data(self, parsed_path):
+        """Serve visualization data API."""
+        query_params = parse_qs(parsed_path.query)
+        file_name = query_params.get("file", [None])[0]
+        
+        if not file_name or not self.data_dir:
+            self.send_error(400, "Missing file parameter or data_dir not configured")
+            return
+        
+        file_path = self.data_dir / file_name
+        try:
+            st = file_path.stat()
+        except OSError:
+            self.send_error(404, f"File not found: {file_name}")
+            return
+        
+        try:
+            self.send_json(load_viz_payload(str(file_path), st.st_mtime_ns, st.st_size))
+        except Exception as e:
+            self.send_error(500, f"Error reading file: {str(e)}")
+    
+    def _handle_list(self, parsed_path):
+        """List available result files."""
+        if not self.data_dir:
+            self.send_error(404, "Data directory not found")
+            return
+        try:
+            st = self.data_dir.stat()
+        except OSError:
+            self.send_error(404, "Data directory not found")
+            return
+        
+        try:
+            self.send_json(load_file_list(str(self.data_dir), st.st_mtime_ns))
+        except Exception as e:
+            self.send_error(500, f"Error listing files: {str(e)}")
+    
+    # API routes; anything else is served as a static file
+    _API_ROUTES = {
+        "/api/data": _handle_data,
+        "/api/list": _handle_list,
+    }
+    
     def do_GET(self):
         """Handle GET requests."""
         parsed_path = urlparse(self.path)
-        path = parsed_path.path
-        
-        # Serve visualization data API
-        if path == "/api/data":
-            query_params = parse_qs(parsed_path.query)
-            file_name = query_params.get("file", [None])[0]
-            
-            if not file_name or not self.data_dir:
-                self.send_error(400, "Missing file parameter or data_dir not configured")
-                return
-            
-            file_path = self.data_dir / file_name
-            if not file_path.exists():
-                self.send_error(404, f"File not found: {file_name}")
-                return
-            
-            try:
-                with open(file_path, 'r') as f:
-                    data = json.load(f)
-                
-                # Extract visualization_data from result
-                visualization_data = data.get("visualization_data", {})
-                
-                # Add eval data if available
-                if "eval" in data:
-                    visualization_data["eval"] = data["eval"]
-                
-                self.send_response(200)
-                self.send_header("Content-Type", "application/json")
-                self.send_header("Access-Control-Allow-Origin", "*")
-                self.end_headers()
-                self.wfile.write(json.dumps(visualization_data, indent=2).encode('utf-8'))
-            except Exception as e:
-                self.send_error(500, f"Error reading file: {str(e)}")
-            return
         
-        # List available result files
-        if path == "/api/list":
-            if not self.data_dir or not self.data_dir.exists():
-                self.send_error(404, "Data directory not found")
-                return
-            
-            try:
-                files = [f.name for f in self.data_dir.glob("*.json") if f.is_file()]
-                self.send_response(200)
-                self.send_header("Content-Type", "application/json")
-                self.send_header("Access-Control-Allow-Origin", "*")
-                self.end_headers()
-                self.wfile.write(json.dumps({"files": files}, indent=2).encode('utf-8'))
-            except Exception as e:
-                self.send_error(500, f"Error listing files: {str(e)}")
+        handler = self._API_ROUTES.get(parsed_path.path)
+        if handler is not None:
+            handler(self, parsed_path)
             return
         
         # Serve static files
-        if path == "/" or path == "/index.html":
+        if parsed_path.path in ("/", "/index.html"):
             self.path = "/index.html"
         
         return super().do_GET()
@@ -92,7 +163,9 @@ def create_handler_class(data_dir):
     return Handler
 
 
-def main():
+@functools.lru_cache(maxsize=1)
+def _build_parser() -> argparse.ArgumentParser:
+    """Build the command line parser once per process."""
     parser = argparse.ArgumentParser(description="Agent Visualization Server")
     parser.add_argument(
         "--data-dir",
@@ -112,8 +185,11 @@ def main():
         default="localhost",
         help="Host to bind to (default: localhost)"
     )
-    
-    args = parser.parse_args()
+    return parser
+
+
+def main():
+    args = _build_parser().parse_args()
     
     # Convert to absolute path BEFORE changing directory
     data_dir = Path(args.data_dir).resolve()
@@ -126,7 +202,8 @@ def main():
     os.chdir(visualizer_dir)
     
     handler_class = create_handler_class(data_dir)
-    server = HTTPServer((args.host, args.port), handler_class)
+    # One thread per request so a large /api/data read doesn't stall static files
+    server = ThreadingHTTPServer((args.host, args.port), handler_class)
     
     print(f"Agent Visualization Server running at http://{args.host}:{args.port}")
     print(f"Serving data from: {data_dir}")